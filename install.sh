@@ -141,11 +141,35 @@ chmod 440 /etc/sudoers.d/pi-manager
 
 # ========== CONFIGURAR SERVIÇO SYSTEMD ==========
 echo -e "${BLUE}[11/12]${NC} Configurando serviço systemd..."
+
+# Auxiliar privilegiado (root): instalado fora do diretório do usuário para não ser editável por ele
+install -d -o root -g root -m 755 /usr/local/lib/pi-manager
+install -o root -g root -m 644 "$REPO_DIR/src/pi_helper.py" /usr/local/lib/pi-manager/pi_helper.py
+cat > /etc/systemd/system/pi-manager-helper.service << 'EOF'
+[Unit]
+Description=Auxiliar privilegiado do Gerenciador Raspberry PI
+Before=pi-manager.service
+
+[Service]
+Type=simple
+User=root
+ExecStart=/usr/bin/python3 /usr/local/lib/pi-manager/pi_helper.py serve
+RuntimeDirectory=pi-manager
+Restart=always
+RestartSec=2
+StandardOutput=journal
+StandardError=journal
+SyslogIdentifier=pi-manager-helper
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
 cat > /etc/systemd/system/pi-manager.service << 'EOF'
 [Unit]
 Description=Gerenciador Web Raspberry PI
-After=network-online.target
-Wants=network-online.target
+After=network-online.target pi-manager-helper.service
+Wants=network-online.target pi-manager-helper.service
 
 [Service]
 Type=simple
@@ -168,6 +192,7 @@ WantedBy=multi-user.target
 EOF
 
 systemctl daemon-reload
+systemctl enable pi-manager-helper.service
 systemctl enable pi-manager.service
 
 # ========== CONFIGURAR AUTO-LOGIN ==========
@@ -220,6 +245,7 @@ echo -e "  • ALTERE A SENHA PADRÃO após o primeiro login!"
 echo ""
 
 echo -e "${BLUE}🔄 Iniciando o serviço...${NC}"
+systemctl start pi-manager-helper.service
 systemctl start pi-manager.service
 sleep 3
 
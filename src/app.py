@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from urllib.parse import urlparse
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+from urllib.parse import urlparse, quote
 import subprocess
 import os
 import json
@@ -8,9 +8,35 @@ import re
 import threading
 import time
 import shutil
+import tempfile
+import csv
+import io
+from contextlib import contextmanager
+import pwd
 import hashlib
+import atexit
+import signal
+import sys
+import ctypes
+import ctypes.util
+import select
+import struct
+import bisect
+import heapq
+import itertools
+import unicodedata
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from pi_helper import HelperClient, HelperUnavailable, HelperRequestLost
 from datetime import datetime
+from collections import OrderedDict
+import uuid
+import base64
+import http.client
+import socket
+import ssl
+import asyncio
 
 app = Flask(__name__)
 app.secret_key = 'sua_chave_secreta_aqui_altere_para_uma_chave_segura'
@@ -19,6 +45,263 @@ app.secret_key = 'sua_chave_secreta_aqui_altere_para_uma_chave_segura'
 CONFIG_DIR = '/home/administrador/pi-manager/config'
 NETWORK_CONFIG = os.path.join(CONFIG_DIR, 'network.conf')
 AUTOSTART_CONFIG = os.path.join(CONFIG_DIR, 'autostart.conf')
+PASSWORD_MAX_LENGTH = 256  # bem abaixo do limite de requisição do auxiliar privilegiado
+SYNC_MAX_WORKERS = 4  # perfis gravados em paralelo na sincronização de favoritos
+METRICS_HISTORY_FILE = os.path.join(CONFIG_DIR, 'metrics_history.bin')
+
+# Pool pequeno para as partes das APIs limitadas por subprocessos (nmcli etc.)
+api_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='api')
+
+# ========== GRAVAÇÃO ATÔMICA ==========
+class AtomicWriteBatch:
+    """Gravações à prova de queda de energia: cada arquivo vai para um temporário no mesmo
+    diretório, recebe um único fsync e substitui o original via rename. O fsync de cada
+    diretório afetado é feito uma só vez, ao fechar o lote."""
+    def __init__(self):
+        self._directories = set()
+        self._lock = threading.Lock()
+
+    def write(self, path, data, mode=0o644, owner=None):
+        with self.open(path, mode, owner) as f:
+            f.write(data)
+
+    @contextmanager
+    def open(self, path, mode=0o644, owner=None):
+        """Temporário para gravação incremental (binário); substitui path ao sair sem erro"""
+        path = str(path)
+        directory = os.path.dirname(path) or '.'
+        fd, temp = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+            if owner:
+                os.chown(temp, *owner)
+            os.chmod(temp, mode)
+            os.replace(temp, path)
+        except BaseException:
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._directories.add(directory)
+
+    def commit(self):
+        with self._lock:
+            directories, self._directories = self._directories, set()
+        for directory in directories:
+            fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Mesmo com erro, o que já foi renomeado precisa chegar ao disco
+        self.commit()
+        return False
+
+def atomic_write(path, data, mode=0o644, owner=None):
+    """Grava um único arquivo de forma atômica (bytes ou str em UTF-8)"""
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    with AtomicWriteBatch() as batch:
+        batch.write(path, data, mode, owner)
+
+# ========== CACHE DE LEITURA DE ARQUIVOS ==========
+FILE_CACHE_MAX_ENTRIES = 32
+
+class FileParseCache:
+    """Resultado do parse de arquivos pequenos (Bookmarks, autostart.conf) indexado por
+    (caminho, parser) e validado por (mtime_ns, tamanho). Enquanto o arquivo não muda,
+    nenhum leitor relê ou reinterpreta o conteúdo. Os valores são compartilhados entre
+    chamadas: quem precisar alterar deve trabalhar sobre uma cópia."""
+    def __init__(self, max_entries=FILE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, parser):
+        """Valor de parser(bytes do arquivo); FileNotFoundError se o arquivo não existir"""
+        path = str(path)
+        st = os.stat(path)
+        key = (path, parser)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+        with open(path, 'rb') as f:
+            value = parser(f.read())
+        with self._lock:
+            self._entries[key] = (st.st_mtime_ns, st.st_size, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+file_cache = FileParseCache()
+
+def parse_bookmarks(raw):
+    """(bytes, árvore) do Bookmarks; árvore None se o JSON for inválido"""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return raw, None
+    return raw, data if isinstance(data, dict) else None
+
+def parse_autostart(raw):
+    """URLs do autostart.conf, uma por linha"""
+    return tuple(line.strip() for line in raw.decode('utf-8').splitlines() if line.strip())
+
+# ========== BACKUPS DE FAVORITOS ==========
+# Retenção: últimos N, um por dia nos últimos D dias e um por semana nas últimas W semanas
+BACKUP_KEEP_LAST = 10
+BACKUP_KEEP_DAILY = 7
+BACKUP_KEEP_WEEKLY = 4
+BACKUP_PRUNE_EVERY = 50  # backups registrados entre duas aplicações da retenção (e uma vez no boot)
+BACKUP_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+class BookmarkBackupStore:
+    """Backups deduplicados por conteúdo: cada versão distinta do Bookmarks vira um blob
+    nomeado pelo sha256, e um índice TSV (perfil, timestamp, hash) registra cada backup.
+    Backups repetidos do mesmo conteúdo custam apenas uma linha no índice."""
+    def __init__(self, root):
+        self.root = Path(root)
+        self.blobs_dir = self.root / 'blobs'
+        self.index_file = self.root / 'index.tsv'
+        self._lock = threading.Lock()
+        self._appends = 0
+
+    def blob_path(self, digest):
+        return self.blobs_dir / digest[:2] / digest
+
+    def backup(self, profile, source):
+        """Registra o conteúdo atual de source; retorna o hash ou None se não existir"""
+        try:
+            with open(source, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return self.store(profile, data)
+
+    def store(self, profile, data):
+        """Registra um conteúdo já lido em memória; retorna o hash"""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            blob = self.blob_path(digest)
+            if not blob.exists():
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write(blob, data)
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(f"{profile}\t{int(time.time())}\t{digest}\n")
+            self._appends += 1
+            if self._appends >= BACKUP_PRUNE_EVERY:
+                self._appends = 0
+                self._prune_locked()
+        return digest
+
+    def _read_index(self):
+        entries = []
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) == 3 and parts[1].isdigit():
+                        entries.append((parts[0], int(parts[1]), parts[2]))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def entries(self, profile=None):
+        """Backups registrados, do mais recente para o mais antigo"""
+        with self._lock:
+            entries = self._read_index()
+        result = []
+        for entry_profile, timestamp, digest in reversed(entries):
+            if profile and entry_profile != profile:
+                continue
+            blob = self.blob_path(digest)
+            result.append({
+                'profile': entry_profile,
+                'timestamp': timestamp,
+                'date': datetime.fromtimestamp(timestamp).isoformat(),
+                'hash': digest,
+                'size': blob.stat().st_size if blob.exists() else None
+            })
+        return result
+
+    @staticmethod
+    def retained(entries, now=None):
+        """Aplica a política de retenção às entradas (já filtradas por perfil)"""
+        now = now or time.time()
+        ordered = sorted(entries, key=lambda entry: entry[1], reverse=True)
+        keep = set(ordered[:BACKUP_KEEP_LAST])
+        days, weeks = set(), set()
+        for entry in ordered:
+            moment = datetime.fromtimestamp(entry[1])
+            age_days = (now - entry[1]) / 86400
+            day = moment.date()
+            week = moment.isocalendar()[:2]
+            if age_days < BACKUP_KEEP_DAILY and day not in days:
+                days.add(day)
+                keep.add(entry)
+            if age_days < BACKUP_KEEP_WEEKLY * 7 and week not in weeks:
+                weeks.add(week)
+                keep.add(entry)
+        return keep
+
+    def prune(self):
+        with self._lock:
+            return self._prune_locked()
+
+    def _prune_locked(self):
+        """Reescreve o índice só com o que a retenção mantém e apaga blobs órfãos"""
+        entries = self._read_index()
+        by_profile = {}
+        for entry in entries:
+            by_profile.setdefault(entry[0], []).append(entry)
+        keep = set()
+        for profile_entries in by_profile.values():
+            keep |= self.retained(profile_entries)
+        kept = [entry for entry in entries if entry in keep]
+        if len(kept) != len(entries):
+            atomic_write(self.index_file, ''.join(
+                f"{profile}\t{timestamp}\t{digest}\n" for profile, timestamp, digest in kept
+            ))
+        referenced = {digest for _, _, digest in kept}
+        removed = 0
+        if self.blobs_dir.exists():
+            for blob in self.blobs_dir.glob('*/*'):
+                if blob.name not in referenced:
+                    blob.unlink()
+                    removed += 1
+        if removed or len(kept) != len(entries):
+            print(f"🧹 Retenção de backups: {len(entries) - len(kept)} entradas e {removed} blobs removidos")
+        return len(entries) - len(kept), removed
+
+    def read(self, digest):
+        if not BACKUP_HASH_PATTERN.match(digest or ''):
+            raise ValueError('Hash de backup inválido')
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            raise FileNotFoundError(f'Backup {digest} não encontrado')
+        with open(blob, 'rb') as f:
+            return f.read()
 
 # ========== GERENCIADOR DE FAVORITOS (INLINE) ==========
 class ChromiumFavoritesManager:
@@ -32,17 +315,54 @@ class ChromiumFavoritesManager:
         # Define o arquivo de bookmarks no perfil personalizado
         self.bookmarks_file = self.chromium_profile_dir / 'Default' / 'Bookmarks'
         self.backup_dir = self.chromium_profile_dir / 'bookmarks_backup'
+        self.backup_store = BookmarkBackupStore(self.backup_dir)
+        self._user_ids = None
+        self.last_sync_results = []
         
-        # Garante que o diretório existe
-        self.bookmarks_file.parent.mkdir(parents=True, exist_ok=True)
+        # Índice de perfis mantido enquanto o observador de arquivos estiver ativo
+        self.profiles_watched = False
+        self._profiles = None
+        self._profiles_generation = 0
+        self._profiles_lock = threading.Lock()
         
         print(f"📁 Usando perfil personalizado: {self.chromium_profile_dir}")
     
+    def use_profile_dir(self, profile_dir):
+        """Aponta o gerenciador para outro diretório de perfis (ex.: cópia em RAM). Os
+        backups continuam no diretório original, no cartão SD."""
+        self.chromium_profile_dir = Path(profile_dir)
+        self.bookmarks_file = self.chromium_profile_dir / self.bookmarks_file.parent.name / 'Bookmarks'
+        self.invalidate_profiles()
+        print(f"📁 Favoritos agora em: {self.chromium_profile_dir}")
+    
     def detect_active_profile(self):
         """Para perfil personalizado, sempre usa 'Default'"""
         return 'Default'
     
     def find_all_profiles(self):
+        """Perfis válidos; com o observador ativo vem do índice em memória, sem varrer o disco"""
+        with self._profiles_lock:
+            if self._profiles is not None:
+                return list(self._profiles)
+            generation = self._profiles_generation
+        profiles = self.scan_profiles()
+        with self._profiles_lock:
+            # Só guarda se nenhuma alteração chegou durante a varredura
+            if self.profiles_watched and generation == self._profiles_generation:
+                self._profiles = profiles
+        return list(profiles)
+    
+    def has_profile(self, profile):
+        with self._profiles_lock:
+            return self._profiles is not None and profile in self._profiles
+    
+    def invalidate_profiles(self):
+        """Chamado pelo observador quando um perfil aparece, some ou muda"""
+        with self._profiles_lock:
+            self._profiles = None
+            self._profiles_generation += 1
+    
+    def scan_profiles(self):
         """Encontra todos os perfis no diretório personalizado - VERSÃO CORRIGIDA"""
         profiles = []
         try:
@@ -71,10 +391,7 @@ class ChromiumFavoritesManager:
         return profiles
     
     def sync_to_all_profiles(self, urls):
-        """Sincroniza favoritos em TODOS os perfis encontrados - VERSÃO CORRIGIDA"""
-        all_success = True
-        messages = []
-        
+        """Sincroniza favoritos em TODOS os perfis encontrados, em paralelo"""
         profiles = self.find_all_profiles()
         print(f"🔍 Encontrados {len(profiles)} perfis válidos")
         
@@ -82,111 +399,280 @@ class ChromiumFavoritesManager:
             print("⚠️ Nenhum perfil encontrado, usando Default")
             profiles = ['Default']
         
-        for profile in profiles:
-            print(f"🔄 Sincronizando perfil: {profile}")
-            profile_bookmarks = self.chromium_profile_dir / profile / 'Bookmarks'
-            
-            # Cria diretório se não existir
-            profile_bookmarks.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Cria backup
-            backup_dir = self.chromium_profile_dir / 'bookmarks_backup' / profile
-            backup_dir.mkdir(parents=True, exist_ok=True)
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = backup_dir / f'bookmarks_{timestamp}.bak'
-            
-            if profile_bookmarks.exists():
-                try:
-                    shutil.copy2(profile_bookmarks, backup_file)
-                except Exception as e:
-                    print(f"⚠️ Erro no backup do perfil {profile}: {e}")
+        # Hash desejado e uid/gid resolvidos uma única vez; cada perfil tem sua própria
+        # árvore, então a mesclagem e a serialização são feitas por perfil
+        digest = self.managed_digest(self.managed_entries(urls), "Sites Gerenciados")
+        uid, gid = self.get_user_ids()
+        
+        # Um lote para todos os perfis: fsync por arquivo, fsync de diretório ao final
+        with AtomicWriteBatch() as batch:
+            def sync_profile(profile):
+                return self._write_profile(profile, urls, digest, uid, gid, batch)
             
-            # Atualiza favoritos neste perfil
+            if len(profiles) == 1:
+                results = [sync_profile(profiles[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(SYNC_MAX_WORKERS, len(profiles)), thread_name_prefix='sync') as pool:
+                    results = list(pool.map(sync_profile, profiles))
+        
+        # Resultado por perfil, incluindo se o arquivo foi de fato regravado
+        self.last_sync_results = results
+        all_success = all(result['success'] for result in results)
+        return all_success, " | ".join(result['message'] for result in results)
+    
+    def _write_profile(self, profile, urls, digest, uid, gid, batch):
+        """Backup + mesclagem do Bookmarks de um perfil, pulando ambos se nada mudou"""
+        print(f"🔄 Sincronizando perfil: {profile}")
+        profile_bookmarks = self.chromium_profile_dir / profile / 'Bookmarks'
+        
+        # Leitura pelo cache: sem alterações no disco, nem leitura nem parse
+        raw, data = self.load_bookmarks(profile_bookmarks)
+        
+        # Pasta gerenciada em disco idêntica à desejada: nada a gravar nem a copiar
+        if data is not None and self.managed_digest_of(data, "Sites Gerenciados") == digest:
+            print(f"⏭️ Perfil {profile} já está atualizado")
+            return {'profile': profile, 'success': True, 'written': False,
+                    'message': f"⏭️ Perfil {profile}: Sem alterações"}
+        
+        # Cria diretório se não existir
+        profile_bookmarks.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Cria backup (deduplicado por conteúdo)
+        if raw is not None:
             try:
-                # Salva estrutura de bookmarks
-                bookmarks_data = self.create_bookmarks_structure(urls, "Sites Gerenciados")
-                
-                with open(profile_bookmarks, 'w', encoding='utf-8') as f:
-                    json.dump(bookmarks_data, f, indent=2, ensure_ascii=False)
-                
-                # Ajusta permissões
-                uid, gid = self.get_user_ids()
-                os.chown(profile_bookmarks, uid, gid)
-                os.chmod(profile_bookmarks, 0o644)
-                
-                messages.append(f"✅ Perfil {profile}: Sincronizado com {len(urls)} URLs")
-                print(f"✅ Perfil {profile} sincronizado")
-                
+                self.backup_store.store(profile, raw)
             except Exception as e:
-                error_msg = f"❌ Erro em {profile}: {str(e)}"
-                messages.append(error_msg)
-                print(error_msg)
-                all_success = False
+                print(f"⚠️ Erro no backup do perfil {profile}: {e}")
         
-        return all_success, " | ".join(messages)
+        # Atualiza favoritos neste perfil
+        try:
+            # A árvore do cache é compartilhada: a mesclagem trabalha sobre um parse próprio
+            merged, preserved = self.merge_managed_folder(
+                json.loads(raw) if data is not None else None, urls, "Sites Gerenciados")
+            payload = json.dumps(merged, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            
+            # Gravação atômica já com dono e permissões finais
+            batch.write(profile_bookmarks, payload, 0o644, (uid, gid))
+            
+            print(f"✅ Perfil {profile} sincronizado ({preserved} favoritos do usuário preservados)")
+            return {'profile': profile, 'success': True, 'written': True,
+                    'message': f"✅ Perfil {profile}: Sincronizado com {len(urls)} URLs"}
+            
+        except Exception as e:
+            error_msg = f"❌ Erro em {profile}: {str(e)}"
+            print(error_msg)
+            return {'profile': profile, 'success': False, 'written': False, 'message': error_msg}
         
     def get_user_ids(self):
-        """Obtém o UID e GID do usuário"""
-        try:
-            uid = int(subprocess.check_output(['id', '-u', self.username]).strip())
-            gid = int(subprocess.check_output(['id', '-g', self.username]).strip())
-            return uid, gid
-        except:
-            return 1000, 1000
+        """Obtém o UID e GID do usuário (resolvido uma vez via pwd)"""
+        if self._user_ids is None:
+            try:
+                entry = pwd.getpwnam(self.username)
+                self._user_ids = (entry.pw_uid, entry.pw_gid)
+            except KeyError:
+                return 1000, 1000
+        return self._user_ids
+    
+    def restore_backup(self, profile, digest):
+        """Restaura o Bookmarks de um perfil a partir de um backup (o atual vira backup antes)"""
+        data = self.backup_store.read(digest)
+        if profile not in self.find_all_profiles():
+            raise ValueError(f'Perfil {profile} não existe')
+        profile_bookmarks = self.chromium_profile_dir / profile / 'Bookmarks'
+        self.backup_store.backup(profile, profile_bookmarks)
+        atomic_write(profile_bookmarks, data, 0o644, self.get_user_ids())
+        print(f"♻️ Perfil {profile} restaurado do backup {digest[:12]}")
+    
+    @staticmethod
+    def iter_url_nodes(data, root_keys=('bookmark_bar', 'other', 'synced')):
+        """Percorre a árvore com pilha explícita (sem recursão), gerando (nó, pasta) de cada
+        favorito na mesma ordem da travessia em profundidade"""
+        roots = data.get('roots') or {}
+        stack = [(roots[key], key) for key in reversed(root_keys) if isinstance(roots.get(key), dict)]
+        while stack:
+            node, folder_name = stack.pop()
+            if 'children' in node:
+                folder_name = node.get('name', folder_name)
+                children = node.get('children') or []
+                stack.extend((child, folder_name) for child in reversed(children) if isinstance(child, dict))
+            elif node.get('type') == 'url':
+                yield node, folder_name
     
-    def backup_bookmarks(self):
-        """Cria um backup dos bookmarks atuais"""
+    def iter_favorites(self, data):
+        """Favoritos visíveis (sem chrome://), gerados sob demanda"""
+        for node, folder_name in self.iter_url_nodes(data):
+            url = node.get('url', '')
+            if url and not url.startswith('chrome://'):
+                yield node, folder_name
+    
+    def current_favorites_page(self, offset=0, limit=None, count_only=False):
+        """(página de favoritos, total) numa única passada; só monta os dicts da página"""
+        if not self.bookmarks_file.exists():
+            print(f"📭 Arquivo de favoritos não encontrado: {self.bookmarks_file}")
+            return [], 0
+        
         try:
-            if not self.backup_dir.exists():
-                self.backup_dir.mkdir(parents=True, exist_ok=True)
+            _, data = self.load_bookmarks(self.bookmarks_file)
+            if data is None:
+                raise ValueError('JSON inválido')
             
-            if self.bookmarks_file.exists():
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_file = self.backup_dir / f'bookmarks_{timestamp}.bak'
-                shutil.copy2(self.bookmarks_file, backup_file)
-                print(f"✅ Backup criado: {backup_file}")
-                return True
-            return False
+            end = None if limit is None else offset + limit
+            page = []
+            total = 0
+            for node, folder_name in self.iter_favorites(data):
+                if not count_only and total >= offset and (end is None or total < end):
+                    page.append({
+                        'url': node.get('url', ''),
+                        'name': node.get('name', ''),
+                        'folder': folder_name
+                    })
+                total += 1
+            return page, total
         except Exception as e:
-            print(f"⚠️ Erro ao criar backup: {e}")
-            return False
+            print(f"❌ Erro ao carregar favoritos: {e}")
+            return [], 0
     
     def load_current_favorites(self):
         """Carrega os favoritos atuais do Chromium"""
-        if not self.bookmarks_file.exists():
-            print(f"📭 Arquivo de favoritos não encontrado: {self.bookmarks_file}")
-            return []
-        
+        favorites, _ = self.current_favorites_page()
+        print(f"📖 {len(favorites)} favoritos carregados")
+        return favorites
+    
+    @staticmethod
+    def bookmark_name(url, idx):
+        """Nome exibido do favorito, baseado no host da URL"""
         try:
-            with open(self.bookmarks_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            favorites = []
-            
-            def extract_urls(node, folder_name=""):
-                if 'children' in node:
-                    for child in node.get('children', []):
-                        extract_urls(child, node.get('name', folder_name))
-                elif node.get('type') == 'url':
-                    url = node.get('url', '')
-                    name = node.get('name', '')
-                    if url and not url.startswith('chrome://'):
-                        favorites.append({
-                            'url': url,
-                            'name': name,
-                            'folder': folder_name
-                        })
+            parsed = urlparse(url)
+            if parsed.scheme and parsed.netloc:
+                return parsed.netloc.replace('www.', '')
+            return url.replace('http://', '').replace('https://', '').split('/')[0]
+        except:
+            return f"Site {idx + 1}"
+    
+    def managed_entries(self, urls):
+        """Lista (nome, url) que a pasta gerenciada deve conter"""
+        return [(self.bookmark_name(url.strip(), idx), url.strip())
+                for idx, url in enumerate(urls) if url and url.strip()]
+    
+    @staticmethod
+    def managed_digest(entries, folder_name):
+        """Hash do conteúdo da pasta gerenciada (ignora GUIDs, IDs e datas)"""
+        digest = hashlib.sha256(folder_name.encode('utf-8'))
+        for name, url in entries:
+            digest.update(b'\0' + name.encode('utf-8') + b'\0' + url.encode('utf-8'))
+        return digest.hexdigest()
+    
+    @staticmethod
+    def load_bookmarks(bookmarks_file):
+        """Retorna (bytes, árvore) do Bookmarks via cache; árvore None se ilegível,
+        ambos None se não existir. A árvore é compartilhada: não alterar."""
+        try:
+            return file_cache.get(bookmarks_file, parse_bookmarks)
+        except OSError:
+            return None, None
+    
+    @staticmethod
+    def find_managed_folder(data, folder_name):
+        """Pasta gerenciada dentro da barra de favoritos, ou None"""
+        bookmark_bar = (data.get('roots') or {}).get('bookmark_bar') or {}
+        for node in bookmark_bar.get('children', []):
+            if node.get('type') == 'folder' and node.get('name') == folder_name:
+                return node
+        return None
+    
+    def managed_digest_of(self, data, folder_name):
+        """Hash da pasta gerenciada de uma árvore já carregada"""
+        folder = self.find_managed_folder(data, folder_name)
+        # Sem a pasta equivale a pasta vazia (estrutura criada sem URLs)
+        entries = [(child.get('name', ''), child.get('url', ''))
+                   for child in (folder or {}).get('children', []) if child.get('type') == 'url']
+        return self.managed_digest(entries, folder_name)
+    
+    @staticmethod
+    def index_bookmarks(data):
+        """Percorre a árvore uma vez: nós por GUID, (nó, pasta pai) por URL e o maior ID"""
+        by_guid, by_url, max_id = {}, {}, 0
+        stack = [(node, None) for node in (data.get('roots') or {}).values() if isinstance(node, dict)]
+        while stack:
+            node, parent = stack.pop()
+            if node.get('guid'):
+                by_guid[node['guid']] = node
+            try:
+                max_id = max(max_id, int(node.get('id', 0)))
+            except (TypeError, ValueError):
+                pass
+            if node.get('type') == 'url':
+                by_url.setdefault(node.get('url', ''), []).append((node, parent))
+            for child in node.get('children', []):
+                if isinstance(child, dict):
+                    stack.append((child, node))
+        return by_guid, by_url, max_id
+    
+    def merge_managed_folder(self, data, urls, folder_name="Sites Gerenciados"):
+        """Aplica as URLs à pasta gerenciada de uma árvore existente sem tocar no resto.
+        Favoritos cuja URL continua na lista mantêm id, guid e date_added; os novos recebem
+        IDs acima do maior existente. Retorna (árvore, favoritos preservados fora da pasta)."""
+        roots = data.get('roots') if data is not None else None
+        if not isinstance(roots, dict) or not isinstance(roots.get('bookmark_bar'), dict):
+            data = self.create_bookmarks_structure([], folder_name)
+            roots = data['roots']
+        
+        by_guid, by_url, max_id = self.index_bookmarks(data)
+        bookmark_bar = roots['bookmark_bar']
+        bookmark_bar.setdefault('children', [])
+        folder = self.find_managed_folder(data, folder_name)
+        timestamp = int(time.time() * 1000000)
+        
+        def new_id():
+            nonlocal max_id
+            max_id += 1
+            return str(max_id)
+        
+        def new_guid():
+            while True:
+                guid = str(uuid.uuid4())
+                if guid not in by_guid:
+                    by_guid[guid] = None
+                    return guid
+        
+        entries = self.managed_entries(urls)
+        if not entries:
+            # Sem URLs a pasta gerenciada deixa de existir, como na estrutura original
+            if folder is not None:
+                bookmark_bar['children'].remove(folder)
+                bookmark_bar['date_modified'] = str(timestamp)
+        else:
+            if folder is None:
+                folder = {"children": [], "date_added": str(timestamp), "date_modified": str(timestamp),
+                          "guid": new_guid(), "id": new_id(), "name": folder_name, "type": "folder"}
+                bookmark_bar['children'].insert(0, folder)
             
-            roots = data.get('roots', {})
-            for root_key in ['bookmark_bar', 'other', 'synced']:
-                if root_key in roots:
-                    extract_urls(roots[root_key], root_key)
+            reused = set()
+            changed = False
+            children = []
+            for idx, (name, url) in enumerate(entries):
+                node = next((candidate for candidate, parent in by_url.get(url, ())
+                             if parent is folder and id(candidate) not in reused), None)
+                if node is None:
+                    node = {"date_added": str(timestamp + idx), "guid": new_guid(), "id": new_id(),
+                            "meta_info": {"last_visited_desktop": "0"}, "name": name,
+                            "type": "url", "url": url}
+                    changed = True
+                else:
+                    reused.add(id(node))
+                    changed = changed or node.get('name') != name
+                    node['name'] = name
+                children.append(node)
             
-            print(f"📖 {len(favorites)} favoritos carregados")
-            return favorites
-        except Exception as e:
-            print(f"❌ Erro ao carregar favoritos: {e}")
-            return []
+            # Remoções e reordenações também contam como alteração da pasta
+            if changed or [id(node) for node in children] != [id(node) for node in folder['children']]:
+                folder['date_modified'] = str(timestamp)
+            folder['children'] = children
+        
+        # O checksum antigo não vale mais; o Chromium recalcula ao carregar
+        data['checksum'] = ""
+        preserved = sum(1 for nodes in by_url.values() for _, parent in nodes if parent is not folder)
+        return data, preserved
     
     def create_bookmarks_structure(self, urls, folder_name="Sites Gerenciados"):
         """Cria a estrutura JSON para os bookmarks - VERSÃO CORRIGIDA"""
@@ -204,14 +690,7 @@ class ChromiumFavoritesManager:
             
             url = url.strip()
             # Formata o nome baseado na URL
-            try:
-                parsed = urlparse(url)
-                if parsed.scheme and parsed.netloc:
-                    name = parsed.netloc.replace('www.', '')
-                else:
-                    name = url.replace('http://', '').replace('https://', '').split('/')[0]
-            except:
-                name = f"Site {idx + 1}"
+            name = self.bookmark_name(url, idx)
             
             # Cria GUID no formato correto (32 caracteres com hífens)
             guid = str(uuid.uuid4())
@@ -289,50 +768,47 @@ class ChromiumFavoritesManager:
             "version": 1
         }
     
-    def update_favorites(self, urls, folder_name="Sites Gerenciados"):
+    def update_favorites(self, urls, folder_name="Sites Gerenciados", force=False):
         """Atualiza os favoritos do Chromium com as URLs configuradas"""
         try:
             print(f"🔄 Atualizando favoritos com {len(urls)} URLs...")
+            profile = self.bookmarks_file.parent.name
             
             # 1. Garante que o diretório existe
             self.bookmarks_file.parent.mkdir(parents=True, exist_ok=True)
             
-            # 2. Backup dos favoritos atuais
-            self.backup_bookmarks()
-            
-            # 3. Carrega favoritos existentes (para preservar outros)
-            existing_favs = self.load_current_favorites()
-            print(f"📖 {len(existing_favs)} favoritos existentes encontrados")
+            # Lê o arquivo atual uma única vez
+            raw, data = self.load_bookmarks(self.bookmarks_file)
             
-            # 4. Preserva favoritos que não estão na pasta gerenciada
-            preserved_favs = []
-            for fav in existing_favs:
-                if fav.get('folder') != folder_name and fav.get('folder') != "Sites Gerenciados":
-                    preserved_favs.append(fav)
+            # Pasta gerenciada já idêntica: pula gravação e backup
+            digest = self.managed_digest(self.managed_entries(urls), folder_name)
+            if not force and data is not None and self.managed_digest_of(data, folder_name) == digest:
+                print("⏭️ Favoritos já estão atualizados")
+                self.last_sync_results = [{'profile': profile, 'success': True, 'written': False,
+                                           'message': f"⏭️ Perfil {profile}: Sem alterações"}]
+                return True, f"Favoritos já atualizados: {len(urls)} URLs, nenhuma alteração"
             
-            print(f"💾 Preservando {len(preserved_favs)} favoritos não gerenciados")
-            
-            # 5. Cria nova estrutura combinando preservados + novos
-            all_urls = urls.copy()
-            combined_favs = preserved_favs + [
-                {'url': url, 'name': '', 'folder': folder_name} for url in urls
-            ]
+            # 2. Backup dos favoritos atuais
+            if raw is not None:
+                try:
+                    backup_digest = self.backup_store.store(profile, raw)
+                    print(f"✅ Backup registrado: {backup_digest[:12]}")
+                except Exception as e:
+                    print(f"⚠️ Erro ao criar backup: {e}")
             
-            # 6. Cria estrutura completa
-            bookmarks_data = self.create_bookmarks_structure(all_urls, folder_name)
+            # 3-6. Mescla só a pasta gerenciada; o resto da árvore fica intacto
+            bookmarks_data, preserved = self.merge_managed_folder(
+                json.loads(raw) if data is not None else None, urls, folder_name)
+            print(f"💾 Preservando {preserved} favoritos não gerenciados")
             
-            # 7. Salva o arquivo
-            with open(self.bookmarks_file, 'w', encoding='utf-8') as f:
-                json.dump(bookmarks_data, f, indent=2, ensure_ascii=False)
+            # 7. Salva o arquivo (atômico, já com dono e permissões)
+            uid, gid = self.get_user_ids()
+            payload = json.dumps(bookmarks_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            atomic_write(self.bookmarks_file, payload, 0o644, (uid, gid))
             
-            # 8. Ajusta permissões
+            # 8. Ajusta permissões dos diretórios
             try:
-                uid, gid = self.get_user_ids()
-                os.chown(self.bookmarks_file, uid, gid)
-                os.chmod(self.bookmarks_file, 0o644)
-                
-                # Ajusta permissões do diretório também
-                for path in [self.bookmarks_file.parent, self.chromium_dir]:
+                for path in [self.bookmarks_file.parent, self.chromium_profile_dir]:
                     if path.exists():
                         os.chown(path, uid, gid)
                         os.chmod(path, 0o755)
@@ -340,7 +816,9 @@ class ChromiumFavoritesManager:
                 print(f"⚠️ Aviso de permissões: {perm_error}")
             
             print(f"✅ Favoritos atualizados com sucesso")
-            return True, f"Favoritos atualizados: {len(urls)} URLs adicionadas, {len(preserved_favs)} preservadas"
+            self.last_sync_results = [{'profile': profile, 'success': True, 'written': True,
+                                       'message': f"✅ Perfil {profile}: Sincronizado com {len(urls)} URLs"}]
+            return True, f"Favoritos atualizados: {len(urls)} URLs adicionadas, {preserved} preservadas"
             
         except Exception as e:
             print(f"❌ Erro ao atualizar favoritos: {e}")
@@ -379,39 +857,235 @@ class ChromiumFavoritesManager:
 # Inicializa o gerenciador
 favorites_manager = ChromiumFavoritesManager()
 
+# ========== ÍNDICE DE BUSCA DE FAVORITOS ==========
+SEARCH_TOKEN_PATTERN = re.compile(r'\w+')
+SEARCH_HOST_WEIGHT = 3.0     # termo presente no host
+SEARCH_TITLE_WEIGHT = 2.0    # termo presente no título
+SEARCH_PREFIX_FACTOR = 0.5   # termo casado apenas como prefixo
+SEARCH_MAX_RESULTS = 100
+SEARCH_MATCH_CACHE = 64      # termos recentes por segmento (busca enquanto se digita)
+
+def search_tokens(text):
+    """Tokens em minúsculas e sem acentos ("São Paulo" -> ["sao", "paulo"])"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return SEARCH_TOKEN_PATTERN.findall(text)
+
+class BookmarkSearchSegment:
+    """Índice invertido dos favoritos de um perfil: token -> (documentos com o token no
+    host, demais documentos com o token no título) e o vocabulário ordenado para buscas
+    por prefixo via bisect. Conjuntos em vez de listas deixam uniões e interseções em C."""
+    def __init__(self, profile, signature, data):
+        self.profile = profile
+        self.signature = signature
+        self.docs = []
+        postings = {}
+        roots = (data or {}).get('roots') or {}
+        stack = [(root, ()) for root in reversed(list(roots.values())) if isinstance(root, dict)]
+        while stack:
+            node, path = stack.pop()
+            if 'children' in node:
+                path = path + (node.get('name', ''),)
+                stack.extend((child, path) for child in reversed(node.get('children') or []) if isinstance(child, dict))
+                continue
+            url = node.get('url', '')
+            if node.get('type') != 'url' or not url or url.startswith('chrome://'):
+                continue
+            doc = len(self.docs)
+            name = node.get('name', '')
+            self.docs.append((url, name, ' / '.join(path)))
+            host_tokens = set(search_tokens(urlparse(url).hostname or '')) - {'www'}
+            for token in host_tokens:
+                postings.setdefault(token, (set(), set()))[0].add(doc)
+            for token in set(search_tokens(name)) - host_tokens:
+                postings.setdefault(token, (set(), set()))[1].add(doc)
+        self.postings = postings
+        self.vocabulary = sorted(postings)
+        self._matches = {}
+
+    def match(self, term):
+        """Conjuntos de documentos com o termo: (host exato, título exato, host por prefixo,
+        título por prefixo). Os pesos só entram depois da interseção."""
+        match = self._matches.get(term)
+        if match is not None:
+            return match
+        exact = self.postings.get(term, (set(), set()))
+        prefix_host, prefix_title = set(), set()
+        # Termos de uma letra só casam exatamente, para não varrer meio vocabulário
+        if len(term) > 1:
+            start = bisect.bisect_right(self.vocabulary, term)
+            end = bisect.bisect_left(self.vocabulary, term + '\uffff', start)
+            for token in self.vocabulary[start:end]:
+                host, title = self.postings[token]
+                prefix_host |= host
+                prefix_title |= title
+        # O segmento nunca muda depois de construído: o cache só precisa de limite
+        if len(self._matches) >= SEARCH_MATCH_CACHE:
+            self._matches.clear()
+        match = self._matches[term] = (exact[0], exact[1], prefix_host, prefix_title)
+        return match
+
+    @staticmethod
+    def tiers(match):
+        """(documentos, peso) do melhor nível para o pior: exato antes de prefixo"""
+        host, title, prefix_host, prefix_title = match
+        return ((host, SEARCH_HOST_WEIGHT), (title, SEARCH_TITLE_WEIGHT),
+                (prefix_host, SEARCH_HOST_WEIGHT * SEARCH_PREFIX_FACTOR),
+                (prefix_title, SEARCH_TITLE_WEIGHT * SEARCH_PREFIX_FACTOR))
+
+    def ranked(self, matches, limit):
+        """Os `limit` melhores (pontuação, documento) entre os que têm todos os termos.
+        Como os pesos são poucos valores fixos, os documentos são agrupados por pontuação
+        com operações de conjunto, sem calcular a nota de cada um em Python."""
+        if len(matches) == 1:
+            # Um termo: basta descer pelos níveis até completar o limite. Um nível só é
+            # visitado se todos os documentos dos anteriores já entraram em result.
+            result, taken = [], set()
+            for tier, weight in self.tiers(matches[0]):
+                result.extend((weight, doc) for doc in self.first_docs(tier - taken, limit - len(result)))
+                if len(result) >= limit:
+                    break
+                taken.update(doc for _, doc in result)
+            return result
+        doc_sets = sorted((match[0] | match[1] | match[2] | match[3] for match in matches), key=len)
+        docs = doc_sets[0].intersection(*doc_sets[1:])
+        groups = {0.0: docs} if docs else {}
+        for match in matches:
+            regrouped = {}
+            for score, group in groups.items():
+                # Cada documento fica no melhor nível do termo
+                for tier, weight in self.tiers(match):
+                    part = group & tier
+                    if part:
+                        group = group - part
+                        key = score + weight
+                        regrouped[key] = regrouped[key] | part if key in regrouped else part
+                    if not group:
+                        break
+            groups = regrouped
+        result = []
+        for score in sorted(groups, reverse=True):
+            # Empate fica com a ordem dos favoritos
+            result.extend((score, doc) for doc in self.first_docs(groups[score], limit - len(result)))
+            if len(result) >= limit:
+                break
+        return result
+
+    def first_docs(self, docs, count):
+        """Os `count` primeiros documentos do conjunto, na ordem dos favoritos"""
+        if len(docs) * 8 < len(self.docs):
+            return sorted(docs)[:count]
+        # Conjunto denso: varrer os ids em ordem para logo (filter e islice rodam em C)
+        return list(itertools.islice(filter(docs.__contains__, range(len(self.docs))), count))
+
+class BookmarkSearchIndex:
+    """Busca de favoritos em todos os perfis. Cada perfil tem seu segmento, reconstruído
+    numa thread própria quando (mtime_ns, tamanho) do Bookmarks muda; até o novo ficar
+    pronto, as buscas usam o anterior. Só um perfil que ainda não tem segmento faz a
+    busca esperar pela construção."""
+    def __init__(self, manager):
+        self.manager = manager
+        self._segments = {}  # substituído inteiro a cada troca: leitores usam a cópia que pegaram
+        self._building = {}  # perfil -> Future da reconstrução em andamento
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-index')
+
+    def _signatures(self):
+        signatures = {}
+        for profile in self.manager.find_all_profiles():
+            try:
+                st = os.stat(self.manager.chromium_profile_dir / profile / 'Bookmarks')
+                signatures[profile] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                pass
+        return signatures
+
+    def refresh(self):
+        """Agenda a reconstrução dos perfis alterados (chamado nas buscas e após sincronizar)"""
+        signatures = self._signatures()
+        with self._lock:
+            if self._segments.keys() - signatures.keys():
+                self._segments = {profile: segment for profile, segment in self._segments.items() if profile in signatures}
+            for profile, signature in signatures.items():
+                segment = self._segments.get(profile)
+                if (segment is None or segment.signature != signature) and profile not in self._building:
+                    self._building[profile] = self._executor.submit(self._rebuild, profile)
+            return dict(self._segments), dict(self._building)
+
+    def _rebuild(self, profile):
+        bookmarks_file = self.manager.chromium_profile_dir / profile / 'Bookmarks'
+        try:
+            st = os.stat(bookmarks_file)
+            _, data = self.manager.load_bookmarks(bookmarks_file)
+            segment = BookmarkSearchSegment(profile, (st.st_mtime_ns, st.st_size), data)
+            with self._lock:
+                self._segments = {**self._segments, profile: segment}
+        except Exception as e:
+            print(f"⚠️ Erro ao indexar favoritos de {profile}: {e}")
+        finally:
+            with self._lock:
+                self._building.pop(profile, None)
+
+    def search(self, query, limit=20):
+        """Favoritos que contêm todos os termos, ordenados por relevância"""
+        terms = list(dict.fromkeys(search_tokens(query)))
+        if not terms:
+            return []
+        segments, building = self.refresh()
+        cold = [future for profile, future in building.items() if profile not in segments]
+        if cold:
+            for future in cold:
+                future.result()
+            with self._lock:
+                segments = dict(self._segments)
+        candidates = []
+        for order, segment in enumerate(segments.values()):
+            # Os melhores de cada perfil bastam
+            candidates.extend((score, -order, -doc, segment) for score, doc in
+                              segment.ranked([segment.match(term) for term in terms], limit))
+        results = []
+        for score, _, doc, segment in heapq.nlargest(limit, candidates, key=lambda item: item[:3]):
+            url, name, folder = segment.docs[-doc]
+            results.append({'profile': segment.profile, 'url': url, 'name': name, 'folder': folder, 'score': score})
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {profile: {'documents': len(segment.docs), 'tokens': len(segment.vocabulary),
+                              'rebuilding': profile in self._building}
+                    for profile, segment in self._segments.items()}
+
+bookmark_search = BookmarkSearchIndex(favorites_manager)
+
 # ========== FUNÇÕES AUXILIARES ==========
 def check_auth():
     return session.get('authenticated')
 
 def get_cpu_usage():
+    """Utilização agregada da CPU no último intervalo do amostrador"""
     try:
-        with open('/proc/stat', 'r') as f:
-            lines = f.readlines()
-        for line in lines:
-            if line.startswith('cpu '):
-                parts = line.split()
-                user = int(parts[1]); nice = int(parts[2]); system = int(parts[3])
-                idle = int(parts[4]); iowait = int(parts[5]); irq = int(parts[6]); softirq = int(parts[7])
-                total = user + nice + system + idle + iowait + irq + softirq
-                used = total - idle
-                if total > 0:
-                    usage_percent = (used / total) * 100
-                    return f"{usage_percent:.1f}%"
-        return "N/A"
+        if not cpu_accounting.samples:
+            cpu_accounting.sample()
+        return f"{cpu_accounting.usage[0]:.1f}%"
     except Exception as e:
         print(f"Erro ao obter uso de CPU: {e}")
         return "N/A"
 
-def get_memory_usage():
-    try:
-        with open('/proc/meminfo', 'r') as f:
-            lines = f.readlines()
-        mem_total = 0; mem_available = 0
-        for line in lines:
+def read_meminfo():
+    """Retorna (MemTotal, MemAvailable) em kB"""
+    mem_total = 0; mem_available = 0
+    with open('/proc/meminfo', 'r') as f:
+        for line in f:
             if line.startswith('MemTotal:'):
                 mem_total = int(line.split()[1])
             elif line.startswith('MemAvailable:'):
                 mem_available = int(line.split()[1])
+                break
+    return mem_total, mem_available
+
+def get_memory_usage():
+    try:
+        mem_total, mem_available = read_meminfo()
         if mem_total > 0 and mem_available > 0:
             mem_used = mem_total - mem_available
             mem_used_mb = mem_used // 1024
@@ -425,154 +1099,1867 @@ def get_memory_usage():
 
 def load_autostart_urls():
     try:
-        if os.path.exists(AUTOSTART_CONFIG):
-            with open(AUTOSTART_CONFIG, 'r') as f:
-                urls = [line.strip() for line in f.readlines() if line.strip()]
-                print(f"📋 URLs carregadas do autostart.conf: {urls}")
-                return urls
+        urls = list(file_cache.get(AUTOSTART_CONFIG, parse_autostart))
+        print(f"📋 URLs carregadas do autostart.conf: {urls}")
+        return urls
+    except FileNotFoundError:
         print("📭 Arquivo autostart.conf não encontrado ou vazio")
         return []
-        
     except Exception as e:
         print(f"Erro ao carregar URLs: {e}")
         return []
 
-def is_valid_url_or_ip(url):
+# Uma única expressão compilada cobre IP, IP:porta, host e host:porta
+URL_ENTRY_PATTERN = re.compile(
+    r'^(?:(?P<ip>\d{1,3}(?:\.\d{1,3}){3})|(?P<host>[a-zA-Z0-9][a-zA-Z0-9.-]*))(?::(?P<port>\d+))?$'
+)
+
+def url_entry_error(url):
+    """Motivo pelo qual a entrada é inválida, ou None se for URL, IP ou host válido"""
     url = url.strip()
     if not url:
-        return True
+        return None
     if url.startswith(('http://', 'https://')):
         try:
             result = urlparse(url)
-            return all([result.scheme, result.netloc])
-        except:
-            return False
-    ip_port_pattern = r'^(\d{1,3}\.){3}\d{1,3}:\d+$'
-    if re.match(ip_port_pattern, url):
-        ip_part = url.split(':')[0]; port_part = url.split(':')[1]
-        parts = ip_part.split('.')
-        if len(parts) == 4:
-            for part in parts:
-                if not part.isdigit() or not 0 <= int(part) <= 255:
-                    return False
-            if port_part.isdigit() and 1 <= int(port_part) <= 65535:
-                return True
+        except ValueError:
+            return 'URL malformada'
+        return None if result.scheme and result.netloc else 'URL sem host'
+    match = URL_ENTRY_PATTERN.match(url)
+    if not match:
+        return 'Formato de URL ou IP inválido'
+    ip, host, port = match.group('ip', 'host', 'port')
+    if ip and any(int(part) > 255 for part in ip.split('.')):
+        return 'Octeto de IP fora do intervalo 0-255'
+    if port is not None and not 1 <= int(port) <= 65535:
+        return 'Porta fora do intervalo 1-65535'
+    # Host sem porta precisa terminar em letra ou dígito (ou ser localhost)
+    if host and port is None and (len(host) < 2 or not host[-1].isalnum()):
+        return 'Formato de URL ou IP inválido'
+    return None
+
+def is_valid_url_or_ip(url):
+    return url_entry_error(url) is None
+
+def format_url(url):
+    if not url.strip():
+        return url
+    if url.startswith(('http://', 'https://')):
+        return url
+    if '://' not in url:
+        return 'http://' + url
+    return url
+
+def sync_chromium_favorites():
+    """Sincroniza os favoritos do Chromium com as URLs configuradas em TODOS os perfis"""
+    try:
+        urls = load_autostart_urls()
+        if not urls:
+            print("ℹ️ Nenhuma URL configurada para sincronizar favoritos")
+            return False, "Nenhuma URL configurada"
+        
+        # Formata URLs
+        formatted_urls = [format_url(url.strip()) for url in urls if url.strip()]
+        print(f"🔄 URLs para sincronizar: {formatted_urls}")
+        
+        # Sincroniza em TODOS os perfis
+        success, message = favorites_manager.sync_to_all_profiles(formatted_urls)
+        
+        # No modo tmpfs, a pasta gerenciada vai para o cartão já, sem esperar o ciclo
+        profile_stager.write_back()
+        # Reindexa a busca em segundo plano, fora do caminho da próxima consulta
+        bookmark_search.refresh()
+        
+        if success:
+            print(f"✅ Favoritos sincronizados em todos os perfis")
+        else:
+            print(f"⚠️ Aviso: {message}")
+        
+        return success, message
+        
+    except Exception as e:
+        print(f"❌ Erro na sincronização de favoritos: {e}")
+        return False, str(e)
+    
+def open_browser_with_urls():
+    """Abre o browser com URLs configuradas e perfil específico. Chamado pelo orquestrador
+    de inicialização depois da sincronização de favoritos e com o display X pronto;
+    conclui quando a janela aparece (ou o tempo de espera acaba)."""
+    try:
+        return browser_supervisor.start(wait_window=True)
+    except Exception as e:
+        print(f"❌ Erro ao abrir browser: {e}")
+        import traceback
+        traceback.print_exc()
         return False
-    ip_pattern = r'^(\d{1,3}\.){3}\d{1,3}$'
-    if re.match(ip_pattern, url):
-        parts = url.split('.')
-        if len(parts) == 4:
-            for part in parts:
-                if not part.isdigit() or not 0 <= int(part) <= 255:
-                    return False
+
+# ========== OBSERVADOR DE ARQUIVOS ==========
+WATCH_DEBOUNCE = 1.0        # segundos sem novas alterações antes de sincronizar
+WATCH_POLL_INTERVAL = 2.0   # intervalo do modo de varredura, sem inotify
+PROFILE_MARKERS = ('Bookmarks', 'Preferences')
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOSE_WRITE = 0x00000008
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT = struct.Struct('iIII')
+INOTIFY_DIR_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+INOTIFY_CONFIG_MASK = INOTIFY_DIR_MASK | IN_CLOSE_WRITE  # edições no próprio arquivo também contam
+
+class Inotify:
+    """inotify do kernel via ctypes (inotify_init1/inotify_add_watch da libc)"""
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 falhou')
+        self.paths = {}
+
+    def add_watch(self, path, mask=INOTIFY_DIR_MASK):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch falhou: {path}')
+        self.paths[wd] = str(path)
+        return wd
+
+    def read_events(self, timeout):
+        """Eventos (diretório, máscara, nome) disponíveis em até timeout segundos (None = sem limite)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            events.append((self.paths.get(wd), mask, name))
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+        return events
+
+class ConfigWatcher:
+    """Observa o autostart.conf e o diretório de perfis do Chromium. Edições no
+    autostart.conf (inclusive manuais) disparam uma sincronização de favoritos com
+    debounce; perfis criados ou removidos invalidam o índice de perfis do gerenciador.
+    Sem inotify disponível, cai para varredura periódica de mtimes."""
+    def __init__(self, manager, config_path, on_config_change, debounce=WATCH_DEBOUNCE):
+        self.manager = manager
+        self.config_path = str(config_path)
+        self.on_config_change = on_config_change
+        self.debounce = debounce
+        self.mode = None
+        self.syncs = 0
+        self.last_change = None
+        self._sync_due = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        try:
+            inotify = Inotify()
+            inotify.add_watch(os.path.dirname(self.config_path), INOTIFY_CONFIG_MASK)
+            self._watch_profiles(inotify)
+            self.mode = 'inotify'
+            target, args = self._run_inotify, (inotify,)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️ inotify indisponível ({e}); observando arquivos por varredura")
+            self.mode = 'polling'
+            target, args = self._run_polling, ()
+        self.manager.profiles_watched = True
+        self.manager.invalidate_profiles()
+        self._thread = threading.Thread(target=target, args=args, daemon=True, name='config-watcher')
+        self._thread.start()
+        print(f"👀 Observador de arquivos iniciado ({self.mode})")
+
+    def status(self):
+        return {'mode': self.mode, 'syncs': self.syncs, 'last_change': self.last_change}
+
+    def _watch_profiles(self, inotify):
+        root = self.manager.chromium_profile_dir
+        inotify.add_watch(root)
+        for entry in os.scandir(root):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                inotify.add_watch(entry.path)
+
+    def _config_changed(self):
+        self.last_change = datetime.now().isoformat(timespec='seconds')
+        self._sync_due = time.monotonic() + self.debounce
+
+    def _run_sync_if_due(self):
+        if self._sync_due is None or time.monotonic() < self._sync_due:
+            return
+        self._sync_due = None
+        print("📝 autostart.conf alterado; sincronizando favoritos...")
+        try:
+            self.on_config_change()
+            self.syncs += 1
+        except Exception as e:
+            print(f"❌ Erro na sincronização automática: {e}")
+
+    def _run_inotify(self, inotify):
+        config_dir = os.path.dirname(self.config_path)
+        config_name = os.path.basename(self.config_path)
+        root = str(self.manager.chromium_profile_dir)
+        while True:
+            timeout = None if self._sync_due is None else max(0, self._sync_due - time.monotonic())
+            for path, mask, name in inotify.read_events(timeout):
+                if mask & IN_Q_OVERFLOW:
+                    # Eventos perdidos: assume que tudo mudou
+                    self.manager.invalidate_profiles()
+                    self._config_changed()
+                elif path == config_dir and name == config_name:
+                    self._config_changed()
+                elif path == root:
+                    self.manager.invalidate_profiles()
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                        try:
+                            inotify.add_watch(os.path.join(root, name))
+                        except OSError:
+                            pass
+                elif path is not None and name in PROFILE_MARKERS:
+                    # Regravar o Bookmarks de um perfil já indexado não muda o índice
+                    if mask & (IN_DELETE | IN_MOVED_FROM) or not self.manager.has_profile(os.path.basename(path)):
+                        self.manager.invalidate_profiles()
+            self._run_sync_if_due()
+
+    def _profiles_signature(self):
+        try:
+            return tuple(sorted((entry.name, entry.stat().st_mtime_ns)
+                                for entry in os.scandir(self.manager.chromium_profile_dir)
+                                if entry.is_dir()))
+        except OSError:
+            return None
+
+    def _config_signature(self):
+        try:
+            st = os.stat(self.config_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _run_polling(self):
+        config_signature = self._config_signature()
+        profiles_signature = self._profiles_signature()
+        while True:
+            time.sleep(WATCH_POLL_INTERVAL)
+            current = self._config_signature()
+            if current != config_signature:
+                config_signature = current
+                self._config_changed()
+            current = self._profiles_signature()
+            if current != profiles_signature:
+                profiles_signature = current
+                self.manager.invalidate_profiles()
+            self._run_sync_if_due()
+
+config_watcher = ConfigWatcher(favorites_manager, AUTOSTART_CONFIG, sync_chromium_favorites)
+
+# ========== EXECUÇÃO DE COMANDOS ==========
+# Limites por família de comandos: timeout (s) e quantos podem rodar ao mesmo tempo
+COMMAND_FAMILIES = {
+    'nmcli': {'timeout': 20, 'concurrency': 2},
+    'system': {'timeout': 15, 'concurrency': 1},
+    'power': {'timeout': 10, 'concurrency': 1},
+    'process': {'timeout': 5, 'concurrency': 2},
+    'display': {'timeout': 30, 'concurrency': 2},
+    'auth': {'timeout': 10, 'concurrency': 2},
+    'default': {'timeout': 30, 'concurrency': 4},
+}
+COMMAND_FAMILY_OF = {
+    'nmcli': 'nmcli',
+    'hostnamectl': 'system', 'set_hostname': 'system', 'chpasswd': 'system', 'sed': 'system',
+    'shutdown': 'power',
+    'pkill': 'process', 'pgrep': 'process',
+    'xdotool': 'display',
+    'sudo': 'auth',
+}
+# Limites superiores (ms) das faixas do histograma de latência
+COMMAND_LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Comandos que exigem root passam pelo auxiliar (pi_helper.py) via socket Unix;
+# sem o auxiliar rodando, cai para o sudo como antes.
+privileged_helper = HelperClient()
+
+class CommandRunner:
+    """Ponto único de execução de comandos externos: timeout, limite de concorrência
+    por família e estatísticas de latência/falhas por comando."""
+    def __init__(self, families=COMMAND_FAMILIES):
+        self.families = families
+        self._semaphores = {name: threading.BoundedSemaphore(config['concurrency']) for name, config in families.items()}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def label(argv):
+        """Nome do comando nas estatísticas: programa + primeiro argumento posicional"""
+        skip = False
+        for arg in argv[1:]:
+            if skip:
+                skip = False
+            elif arg in ('-f', '--fields'):
+                skip = True
+            elif not arg.startswith('-'):
+                return f"{argv[0]} {arg}"
+        return argv[0]
+
+    def run(self, argv, input=None, timeout=None, family=None, privileged=False):
+        """Executa argv e retorna subprocess.CompletedProcess (texto, saída capturada).
+
+        Lança subprocess.TimeoutExpired se o comando, ou a espera por uma vaga na
+        família, passar do timeout.
+        """
+        family = family or COMMAND_FAMILY_OF.get(argv[0], 'default')
+        config = self.families.get(family, self.families['default'])
+        timeout = timeout or config['timeout']
+        label = self.label(argv)
+        semaphore = self._semaphores.get(family, self._semaphores['default'])
+        start = time.perf_counter()
+        if not semaphore.acquire(timeout=timeout):
+            self._record(label, family, time.perf_counter() - start, failed=True, timed_out=True)
+            raise subprocess.TimeoutExpired(argv, timeout)
+        result = None
+        timed_out = False
+        try:
+            if privileged:
+                result = self._run_privileged(argv, input, timeout)
+            else:
+                result = subprocess.run(argv, input=input, capture_output=True, text=True, timeout=timeout)
+            return result
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            raise
+        finally:
+            semaphore.release()
+            failed = result is None or result.returncode != 0
+            self._record(label, family, time.perf_counter() - start, failed, timed_out)
+
+    def _run_privileged(self, argv, input, timeout):
+        if privileged_helper.available():
+            try:
+                if argv[0] == 'set_hostname':
+                    response = privileged_helper.call('set_hostname', argv[1:], timeout=timeout)
+                    if response.get('timeout'):
+                        raise subprocess.TimeoutExpired(argv, timeout)
+                    return subprocess.CompletedProcess(argv, response['returncode'], response['stdout'], response['stderr'])
+                return privileged_helper.run(argv, input, timeout)
+            except HelperRequestLost as e:
+                # O auxiliar recebeu a requisição: o comando pode ter rodado, sem repetir nem sudo
+                print(f"❌ Resposta do auxiliar perdida para {argv[0]}: {e}")
+                raise
+            except HelperUnavailable as e:
+                print(f"⚠️ Auxiliar privilegiado indisponível, usando sudo: {e}")
+        if argv[0] == 'set_hostname':
+            hostname = argv[1]
+            result = subprocess.run(['sudo', 'hostnamectl', 'set-hostname', hostname], capture_output=True, text=True, timeout=timeout)
+            subprocess.run(['sudo', 'sed', '-i', f's/.*/{hostname}/', '/etc/hostname'], capture_output=True, text=True, timeout=timeout)
+            subprocess.run(['sudo', 'sed', '-i', f's/127.0.1.1.*/127.0.1.1\\t{hostname}/', '/etc/hosts'], capture_output=True, text=True, timeout=timeout)
+            return result
+        return subprocess.run(['sudo'] + argv, input=input, capture_output=True, text=True, timeout=timeout)
+
+    def _record(self, label, family, elapsed, failed, timed_out):
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            stats = self._stats.get(label)
+            if stats is None:
+                stats = self._stats[label] = {
+                    'family': family,
+                    'count': 0,
+                    'failures': 0,
+                    'timeouts': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'histogram': [0] * (len(COMMAND_LATENCY_BUCKETS) + 1)
+                }
+            stats['count'] += 1
+            stats['failures'] += 1 if failed else 0
+            stats['timeouts'] += 1 if timed_out else 0
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            bucket = len(COMMAND_LATENCY_BUCKETS)
+            for index, limit in enumerate(COMMAND_LATENCY_BUCKETS):
+                if elapsed_ms <= limit:
+                    bucket = index
+                    break
+            stats['histogram'][bucket] += 1
+
+    def stats(self):
+        with self._lock:
+            commands = {}
+            for label, stats in self._stats.items():
+                commands[label] = {
+                    'family': stats['family'],
+                    'count': stats['count'],
+                    'failures': stats['failures'],
+                    'timeouts': stats['timeouts'],
+                    'avg_ms': round(stats['total_ms'] / stats['count'], 2) if stats['count'] else 0,
+                    'max_ms': round(stats['max_ms'], 2),
+                    'histogram': list(stats['histogram'])
+                }
+        # histogram[i] conta execuções <= buckets_ms[i]; a última posição é o excedente
+        return {'families': self.families, 'buckets_ms': list(COMMAND_LATENCY_BUCKETS), 'commands': commands}
+
+command_runner = CommandRunner()
+
+def run_privileged(argv, input=None, timeout=None):
+    """Executa um comando como root e retorna um subprocess.CompletedProcess"""
+    return command_runner.run(argv, input=input, timeout=timeout, privileged=True)
+
+def set_hostname_privileged(hostname):
+    """Altera o hostname (hostnamectl, /etc/hostname e /etc/hosts)"""
+    return run_privileged(['set_hostname', hostname])
+
+# ========== PERFIL DO CHROMIUM EM MEMÓRIA ==========
+# disk: Chromium roda direto do cartão SD (padrão). tmpfs: o perfil é copiado para a RAM
+# no launch e só os arquivos duráveis voltam ao cartão, periodicamente e no desligamento.
+PROFILE_MODE = os.environ.get('PI_MANAGER_PROFILE_MODE', 'disk')
+PROFILE_RAM_DIR = os.environ.get('PI_MANAGER_PROFILE_RAM_DIR', '/dev/shm/pi-manager-chromium')
+PROFILE_WRITEBACK_INTERVAL = int(os.environ.get('PI_MANAGER_PROFILE_WRITEBACK', 300))
+PROFILE_DISK_CACHE_SIZE = 64 * 1024 * 1024  # limite do cache HTTP em RAM
+PROFILE_DURABLE_FILES = ('Bookmarks', 'Preferences')
+PROFILE_ROOT_DURABLE_FILES = ('Local State',)  # lista de perfis e configurações globais
+PROFILE_STAGE_SKIP = ('Cache', 'Code Cache', 'GPUCache', 'ShaderCache', 'GrShaderCache',
+                      'DawnCache', 'Service Worker', 'Singleton*', 'bookmarks_backup')
+PROFILE_STAGED_MARKER = '.pi-manager-staged'
+
+class ProfileStager:
+    """Copia o perfil do Chromium para um tmpfs e devolve ao cartão SD apenas Bookmarks,
+    Preferences e Local State. Caches e histórico ficam só na RAM."""
+    def __init__(self, manager, mode=PROFILE_MODE, ram_dir=PROFILE_RAM_DIR, interval=PROFILE_WRITEBACK_INTERVAL):
+        self.manager = manager
+        self.mode = mode
+        self.persistent_dir = Path(manager.chromium_profile_dir)
+        self.ram_dir = Path(ram_dir)
+        self.interval = interval
+        self.staged = False
+        self.last_write_back = None
+        self.files_written = 0
+        self._signatures = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def active_dir(self):
+        return self.ram_dir if self.staged else self.persistent_dir
+
+    def stage(self):
+        """Prepara a cópia em RAM (modo tmpfs) e redireciona o gerenciador de favoritos"""
+        if self.mode != 'tmpfs' or self.staged:
             return True
-        return False
-    hostname_port_pattern = r'^[a-zA-Z0-9][a-zA-Z0-9.-]*:\d+$'
-    if re.match(hostname_port_pattern, url):
-        port_part = url.split(':')[1]
-        if port_part.isdigit() and 1 <= int(port_part) <= 65535:
+        reused = (self.ram_dir / PROFILE_STAGED_MARKER).exists()
+        try:
+            if reused:
+                # App reiniciado com a cópia ainda na RAM: ela é mais nova que a do cartão
+                print(f"♻️ Reaproveitando perfil em RAM: {self.ram_dir}")
+            else:
+                start = time.perf_counter()
+                shutil.copytree(self.persistent_dir, self.ram_dir, symlinks=True, dirs_exist_ok=True,
+                                ignore=shutil.ignore_patterns(*PROFILE_STAGE_SKIP))
+                (self.ram_dir / PROFILE_STAGED_MARKER).touch()
+                print(f"🧠 Perfil copiado para {self.ram_dir} em {(time.perf_counter() - start) * 1000:.0f} ms")
+        except OSError as e:
+            print(f"⚠️ Não foi possível preparar o perfil em RAM ({e}); usando o cartão SD")
             return True
-    hostname_pattern = r'^[a-zA-Z0-9][a-zA-Z0-9.-]*[a-zA-Z0-9]$'
-    if re.match(hostname_pattern, url) or url == 'localhost':
+        with self._lock:
+            self.staged = True
+            # Cópia recém-feita já está no cartão; uma reaproveitada pode ter alterações que
+            # não chegaram a ser gravadas antes do app parar
+            self._signatures = {} if reused else {path: signature for path, signature in self._durable_files()}
+        if reused:
+            self.write_back()
+        self.manager.use_profile_dir(self.ram_dir)
+        self._thread = threading.Thread(target=self._run, daemon=True, name='profile-writeback')
+        self._thread.start()
         return True
-    return False
 
-def format_url(url):
-    if not url.strip():
-        return url
-    if url.startswith(('http://', 'https://')):
-        return url
-    if '://' not in url:
-        return 'http://' + url
-    return url
+    def browser_flags(self):
+        flags = [f'--user-data-dir={self.active_dir}']
+        if self.staged:
+            flags.append(f'--disk-cache-size={PROFILE_DISK_CACHE_SIZE}')
+        return flags
+
+    def _durable_files(self):
+        """(caminho relativo, (mtime_ns, tamanho)) dos arquivos duráveis da cópia em RAM"""
+        candidates = [Path(name) for name in PROFILE_ROOT_DURABLE_FILES]
+        for entry in os.scandir(self.ram_dir):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                candidates.extend(Path(entry.name) / name for name in PROFILE_DURABLE_FILES)
+        for relative in candidates:
+            try:
+                st = os.stat(self.ram_dir / relative)
+            except OSError:
+                continue
+            yield relative, (st.st_mtime_ns, st.st_size)
+
+    def write_back(self):
+        """Grava no cartão os arquivos duráveis alterados desde a última vez"""
+        if not self.staged:
+            return 0
+        with self._lock:
+            written = 0
+            with AtomicWriteBatch() as batch:
+                for relative, signature in self._durable_files():
+                    if self._signatures.get(relative) == signature:
+                        continue
+                    try:
+                        with open(self.ram_dir / relative, 'rb') as f:
+                            data = f.read()
+                        target = self.persistent_dir / relative
+                        target.parent.mkdir(parents=True, exist_ok=True)
+                        batch.write(target, data, 0o600 if relative.name == 'Preferences' else 0o644)
+                    except OSError as e:
+                        print(f"⚠️ Erro ao devolver {relative} ao cartão: {e}")
+                        continue
+                    self._signatures[relative] = signature
+                    written += 1
+            self.files_written += written
+            self.last_write_back = datetime.now().isoformat(timespec='seconds')
+        if written:
+            print(f"💾 {written} arquivo(s) do perfil gravados no cartão SD")
+        return written
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write_back()
+            except Exception as e:
+                print(f"⚠️ Erro na gravação periódica do perfil: {e}")
+
+    def status(self):
+        return {
+            'mode': self.mode,
+            'staged': self.staged,
+            'active_dir': str(self.active_dir),
+            'persistent_dir': str(self.persistent_dir),
+            'write_back_interval_s': self.interval,
+            'last_write_back': self.last_write_back,
+            'files_written': self.files_written
+        }
+
+profile_stager = ProfileStager(favorites_manager)
+
+# ========== CONTROLE DO BROWSER VIA CDP ==========
+# Endpoint de depuração do Chromium, só em localhost: troca de abas sem relançar o browser
+CDP_HOST = '127.0.0.1'
+CDP_PORT = int(os.environ.get('PI_MANAGER_CDP_PORT', 9222))
+CDP_TIMEOUT = 3.0
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+class CdpError(Exception):
+    """Falha ao falar com o Chromium pelo DevTools protocol"""
+
+class CdpWebSocket:
+    """Cliente WebSocket mínimo (RFC 6455, só texto) para um alvo do DevTools"""
+    def __init__(self, url, timeout=CDP_TIMEOUT):
+        parsed = urlparse(url)
+        self.sock = socket.create_connection((parsed.hostname, parsed.port or 80), timeout=timeout)
+        self._buffer = b''
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = parsed.path + (f'?{parsed.query}' if parsed.query else '')
+        self.sock.sendall((
+            f'GET {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\nUpgrade: websocket\r\n'
+            f'Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'
+        ).encode())
+        header = self._read_until(b'\r\n\r\n').decode('latin-1')
+        expected = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        if ' 101 ' not in header.split('\r\n', 1)[0] or expected not in header:
+            self.sock.close()
+            raise CdpError(f'Handshake WebSocket recusado: {header.splitlines()[0] if header else "sem resposta"}')
+
+    def _read_exact(self, size):
+        while len(self._buffer) < size:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise CdpError('Conexão WebSocket encerrada')
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _read_until(self, marker):
+        while marker not in self._buffer:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise CdpError('Conexão WebSocket encerrada')
+            self._buffer += chunk
+        data, _, self._buffer = self._buffer.partition(marker)
+        return data
+
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 65536:
+            header += bytes([0x80 | 126]) + struct.pack('!H', length)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack('!Q', length)
+        # Quadros do cliente são sempre mascarados
+        mask = os.urandom(4)
+        masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+        self.sock.sendall(header + mask + masked)
+
+    def send(self, text):
+        self._send_frame(0x1, text.encode('utf-8'))
+
+    def receive(self):
+        """Próxima mensagem de texto completa (junta fragmentos, responde pings)"""
+        message = b''
+        while True:
+            first, second = self._read_exact(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self._read_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self._read_exact(8))[0]
+            mask = self._read_exact(4) if second & 0x80 else None
+            payload = self._read_exact(length)
+            if mask:
+                payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+            if opcode == 0x8:
+                raise CdpError('Conexão WebSocket fechada pelo browser')
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode in (0x0, 0x1, 0x2):
+                message += payload
+                if first & 0x80:
+                    return message.decode('utf-8')
+
+    def close(self):
+        try:
+            self._send_frame(0x8, b'')
+        except OSError:
+            pass
+        self.sock.close()
+
+class CdpClient:
+    """Abas do Chromium via /json (listar, abrir, fechar) e Page.navigate pelo WebSocket"""
+    def __init__(self, host=CDP_HOST, port=CDP_PORT, timeout=CDP_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _http(self, method, path):
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except OSError as e:
+            raise CdpError(f'DevTools indisponível em {self.host}:{self.port}: {e}')
+        finally:
+            connection.close()
+
+    def _json(self, method, path):
+        status, body = self._http(method, path)
+        if status != 200:
+            raise CdpError(f'{method} {path}: HTTP {status}')
+        return json.loads(body) if body.strip().startswith((b'{', b'[')) else body.decode('utf-8', 'replace')
+
+    def available(self):
+        try:
+            self._json('GET', '/json/version')
+            return True
+        except (CdpError, ValueError):
+            return False
+
+    def pages(self):
+        """Abas de conteúdo (sem DevTools, extensões e páginas internas)"""
+        return [target for target in self._json('GET', '/json/list')
+                if target.get('type') == 'page' and not target.get('url', '').startswith(('devtools://', 'chrome-extension://'))]
+
+    def new_tab(self, url):
+        path = '/json/new?' + quote(url, safe='')
+        # Chromium recente exige PUT; versões antigas só aceitam GET
+        status, body = self._http('PUT', path)
+        if status == 405:
+            status, body = self._http('GET', path)
+        if status != 200:
+            raise CdpError(f'Falha ao abrir aba: HTTP {status}')
+        return json.loads(body)
+
+    def close_tab(self, target_id):
+        self._json('GET', f'/json/close/{target_id}')
+
+    def call(self, target, method, params=None):
+        """Executa um comando CDP no alvo e devolve o result"""
+        ws = CdpWebSocket(target['webSocketDebuggerUrl'], self.timeout)
+        try:
+            ws.send(json.dumps({'id': 1, 'method': method, 'params': params or {}}))
+            while True:
+                message = json.loads(ws.receive())
+                if message.get('id') == 1:
+                    if 'error' in message:
+                        raise CdpError(f"{method}: {message['error'].get('message')}")
+                    return message.get('result', {})
+        finally:
+            ws.close()
+
+    def navigate(self, target, url):
+        result = self.call(target, 'Page.navigate', {'url': url})
+        if result.get('errorText'):
+            raise CdpError(f"Page.navigate {url}: {result['errorText']}")
+
+    def reload(self, target):
+        self.call(target, 'Page.reload', {'ignoreCache': False})
+
+def normalized_tab_url(url):
+    return url.rstrip('/')
+
+class KioskTabs:
+    """Aplica a lista de URLs às abas abertas com o mínimo de operações: abas que já
+    mostram uma URL desejada ficam, as que sobram são reaproveitadas com Page.navigate,
+    as que faltam são abertas e as excedentes fechadas. Lembra a URL configurada de cada
+    aba, para que redirecionamentos (http -> https, barra final) não causem recarga."""
+    def __init__(self, client=None):
+        self.client = client or CdpClient()
+        self.assigned = {}
+
+    def apply(self, urls, reload=False):
+        pages = self.client.pages()
+        open_ids = {page['id'] for page in pages}
+        self.assigned = {target_id: url for target_id, url in self.assigned.items() if target_id in open_ids}
+        pending = list(urls)
+        kept, free = [], []
+        for page in pages:
+            assigned = self.assigned.get(page['id'])
+            current = normalized_tab_url(page.get('url', ''))
+            match = next((url for url in pending if url == assigned or normalized_tab_url(url) == current), None)
+            if match is not None:
+                pending.remove(match)
+                kept.append(page)
+                self.assigned[page['id']] = match
+            else:
+                free.append(page)
+        summary = {'kept': len(kept), 'navigated': 0, 'opened': 0, 'closed': 0, 'reloaded': 0}
+        for url in pending:
+            if free:
+                page = free.pop(0)
+                self.client.navigate(page, url)
+                summary['navigated'] += 1
+            else:
+                page = self.client.new_tab(url)
+                summary['opened'] += 1
+            self.assigned[page['id']] = url
+        for page in free:
+            self.client.close_tab(page['id'])
+            self.assigned.pop(page['id'], None)
+            summary['closed'] += 1
+        if reload:
+            for page in kept:
+                self.client.reload(page)
+                summary['reloaded'] += 1
+        return summary
+
+# ========== VERIFICAÇÃO DE ALCANCE DAS URLS ==========
+# Um único event loop asyncio (numa thread) sonda todas as URLs do autostart em paralelo,
+# com conexões keep-alive reaproveitadas por host e timeouts curtos.
+URL_PROBE_ENABLED = os.environ.get('PI_MANAGER_PROBE_URLS', '1') != '0'
+URL_PROBE_CONNECT_TIMEOUT = 2.0  # conexão TCP/TLS
+URL_PROBE_TIMEOUT = 3.0          # requisição completa, por URL
+URL_PROBE_DEADLINE = 10.0        # rodada inteira, independente da quantidade de URLs
+URL_PROBE_PER_HOST = 4           # conexões simultâneas por host
+URL_PROBE_IDLE = 30.0            # segundos que uma conexão ociosa fica no pool
+URL_RETRY_BASE = 5.0             # nova sonda das abas adiadas: 5s, 10s, 20s...
+URL_RETRY_MAX = 60.0
+
+class ProbeConnectError(OSError):
+    """Host recusou ou não completou a conexão"""
+
+class ProbeConnection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def usable(self):
+        return not self.reader.at_eof() and time.monotonic() - self.last_used < URL_PROBE_IDLE
+
+    def close(self):
+        self.writer.close()
+
+class ProbeHostPool:
+    """Conexões de um (esquema, host, porta). Se o host não conectar numa rodada, as
+    demais URLs dele são dadas como fora sem nova tentativa."""
+    def __init__(self):
+        self.idle = []
+        self.semaphore = asyncio.Semaphore(URL_PROBE_PER_HOST)
+        self.failed_round = None
+        self.failure = None
+
+class UrlProber:
+    """Sonda de alcance das URLs: HEAD (GET se o servidor recusar HEAD) com keep-alive.
+    A URL está no ar se respondeu com status abaixo de 500; 401/403/404 ainda indicam
+    um servidor vivo, enquanto 502/503 costumam ser a página de erro de um proxy."""
+    def __init__(self):
+        self.results = {}
+        self.last_probe = None
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self._pools = {}
+        self._round = 0
+        self._loop = None
+        self._lock = threading.Lock()
+        # O kiosk roda com --ignore-certificate-errors: a sonda segue o mesmo critério
+        self._ssl = ssl.create_default_context()
+        self._ssl.check_hostname = False
+        self._ssl.verify_mode = ssl.CERT_NONE
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name='url-prober').start()
+            return self._loop
+
+    def probe(self, urls):
+        """Sonda as URLs (duplicatas uma vez só); retorna {url: resultado}"""
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        start = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(self._probe_all(urls), self._ensure_loop())
+        results = future.result(URL_PROBE_DEADLINE + 1)
+        with self._lock:
+            self.results.update(results)
+            self.last_probe = {
+                'at': datetime.now().isoformat(timespec='seconds'),
+                'urls': len(urls),
+                'up': sum(1 for result in results.values() if result['up']),
+                'took_ms': round((time.perf_counter() - start) * 1000, 1)
+            }
+        return results
+
+    async def _probe_all(self, urls):
+        self._round += 1
+        tasks = {url: asyncio.ensure_future(self._probe_url(url, self._round)) for url in urls}
+        await asyncio.wait(tasks.values(), timeout=URL_PROBE_DEADLINE)
+        results = {}
+        for url, task in tasks.items():
+            if task.done():
+                results[url] = task.result()
+            else:
+                task.cancel()
+                results[url] = self._result(url, error='Tempo da rodada esgotado')
+        return results
+
+    @staticmethod
+    def _result(url, status=None, error=None, latency=None, reused=False, probeable=True):
+        """up é None quando a entrada não é sondável (sem host http/https): não está fora
+        do ar, só não há como saber; o browser a abre como está"""
+        return {
+            'url': url,
+            'up': error is None and status is not None and status < 500 if probeable else None,
+            'probeable': probeable,
+            'status': status,
+            'error': error,
+            'latency_ms': round(latency * 1000, 1) if latency is not None else None,
+            'reused_connection': reused,
+            'checked_at': datetime.now().isoformat(timespec='seconds')
+        }
+
+    async def _probe_url(self, url, round_id):
+        parsed = urlparse(format_url(url))
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            return self._result(url, error='URL sem host http/https', probeable=False)
+        try:
+            port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        except ValueError:
+            return self._result(url, error='Porta inválida', probeable=False)
+        key = (parsed.scheme, parsed.hostname.lower(), port)
+        pool = self._pools.setdefault(key, ProbeHostPool())
+        async with pool.semaphore:
+            if pool.failed_round == round_id:
+                return self._result(url, error=pool.failure)
+            start = time.perf_counter()
+            try:
+                status, reused = await asyncio.wait_for(self._request(pool, key, parsed), URL_PROBE_TIMEOUT)
+            except ProbeConnectError as e:
+                # Só falha de conexão vale para o host todo; página lenta afeta só a URL
+                pool.failed_round, pool.failure = round_id, str(e)
+                return self._result(url, error=str(e))
+            except asyncio.TimeoutError:
+                return self._result(url, error='Tempo esgotado')
+            except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+                return self._result(url, error=str(e) or type(e).__name__)
+            return self._result(url, status, latency=time.perf_counter() - start, reused=reused)
+
+    async def _connect(self, key):
+        scheme, host, port = key
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, ssl=self._ssl if scheme == 'https' else None),
+                URL_PROBE_CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise ProbeConnectError(f'Tempo esgotado ao conectar em {host}:{port}')
+        except OSError as e:
+            raise ProbeConnectError(str(e) or f'Falha ao conectar em {host}:{port}')
+        self.connections_opened += 1
+        return ProbeConnection(reader, writer)
+
+    async def _request(self, pool, key, parsed):
+        """HEAD na URL; retorna (status, conexão reaproveitada)"""
+        while pool.idle:
+            conn = pool.idle.pop()
+            if conn.usable():
+                try:
+                    status, keep_alive = await self._exchange(conn, 'HEAD', parsed)
+                except (OSError, asyncio.IncompleteReadError):
+                    conn.close()  # o servidor fechou a conexão ociosa: tenta uma nova
+                    continue
+                except BaseException:
+                    conn.close()
+                    raise
+                self.connections_reused += 1
+                return await self._finish(pool, key, conn, parsed, status, keep_alive), True
+            conn.close()
+        conn = await self._connect(key)
+        try:
+            status, keep_alive = await self._exchange(conn, 'HEAD', parsed)
+        except BaseException:
+            conn.close()
+            raise
+        return await self._finish(pool, key, conn, parsed, status, keep_alive), False
+
+    async def _finish(self, pool, key, conn, parsed, status, keep_alive):
+        if keep_alive:
+            conn.last_used = time.monotonic()
+            pool.idle.append(conn)
+        else:
+            conn.close()
+        if status in (405, 501):
+            # Servidor não aceita HEAD: GET numa conexão própria, fechada sem ler o corpo
+            get_conn = await self._connect(key)
+            try:
+                status, _ = await self._exchange(get_conn, 'GET', parsed)
+            finally:
+                get_conn.close()
+        return status
+
+    @staticmethod
+    async def _exchange(conn, method, parsed):
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        conn.writer.write((f'{method} {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\n'
+                           'User-Agent: pi-manager-probe\r\nAccept: */*\r\n\r\n').encode('latin-1'))
+        await conn.writer.drain()
+        status_line = await conn.reader.readline()
+        if not status_line:
+            raise ConnectionError('Conexão encerrada pelo servidor')
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        keep_alive = version == 'HTTP/1.1'
+        while True:
+            line = await conn.reader.readline()
+            if not line:
+                raise ConnectionError('Conexão encerrada pelo servidor')
+            if line in (b'\r\n', b'\n'):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'connection':
+                value = value.strip().lower()
+                if value == 'close':
+                    keep_alive = False
+                elif value == 'keep-alive':
+                    keep_alive = True
+        return int(status), keep_alive
+
+    def stats(self):
+        return {
+            'enabled': URL_PROBE_ENABLED,
+            'hosts': len(self._pools),
+            'idle_connections': sum(len(pool.idle) for pool in self._pools.values()),
+            'connections_opened': self.connections_opened,
+            'connections_reused': self.connections_reused,
+            'last_probe': self.last_probe
+        }
+
+url_prober = UrlProber()
+
+# ========== SUPERVISOR DO BROWSER ==========
+BROWSER_USER = 'administrador'
+BROWSER_DISPLAY = ':0'
+BROWSER_FLAGS = [
+    f'--remote-debugging-port={CDP_PORT}',
+    f'--remote-debugging-address={CDP_HOST}',  # DevTools só em localhost
+    '--no-first-run',
+    '--start-maximized',
+    '--ignore-certificate-errors',
+    '--noerrdialogs',
+    '--disable-session-crashed-bubble',
+    '--disable-infobars'
+]
+BROWSER_WINDOW_TIMEOUT = 30    # espera máxima pela janela após o launch
+BROWSER_STOP_TIMEOUT = 5       # SIGTERM -> SIGKILL
+BROWSER_BACKOFF_BASE = 1.0     # 1s, 2s, 4s... entre reinícios após falhas seguidas
+BROWSER_BACKOFF_MAX = 60.0
+BROWSER_STABLE_AFTER = 60.0    # rodando há mais que isso, a próxima queda zera o backoff
+BROWSER_HANDOFF_WINDOW = 10.0  # saída 0 antes disso com outro chromium vivo: repassou as URLs
+BROWSER_EXTERNAL_POLL = 2.0    # intervalo de checagem do chromium que recebeu as URLs
+BROWSER_HISTORY = 20
+
+def browser_command(argv):
+    """Prefixa com sudo -u só quando o app não roda como o usuário do kiosk"""
+    try:
+        same_user = os.geteuid() == pwd.getpwnam(BROWSER_USER).pw_uid
+    except KeyError:
+        same_user = True
+    if same_user:
+        return argv
+    return ['sudo', '-u', BROWSER_USER, 'env', f'DISPLAY={BROWSER_DISPLAY}'] + argv
+
+def chromium_pids():
+    """PIDs de processos chromium lidos do /proc (sem pgrep)"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            comm = read_text_file(f'/proc/{entry}/comm')
+            if comm and comm.startswith('chromium'):
+                pids.append(int(entry))
+    return pids
+
+def descendant_pids(root_pid):
+    """Árvore de processos sob root_pid, via PPid de /proc/<pid>/stat"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        stat = read_text_file(f'/proc/{entry}/stat')
+        if stat:
+            # O nome (campo 2) pode ter espaços: o PPid vem depois do último ')'
+            ppid = int(stat.rsplit(')', 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+    result, stack = [], [root_pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+class BrowserSupervisor:
+    """Mantém o Chromium do kiosk rodando a partir do próprio handle do Popen: detecta a
+    saída pelo pidfd (ou wait() do handle), reinicia com backoff exponencial e mede o
+    tempo do launch até a janela aparecer. Paradas pedidas (restart/stop) não contam
+    como queda, nem a saída imediata de quem repassou as URLs a outro Chromium do perfil."""
+    def __init__(self):
+        self.process = None
+        self.state = 'stopped'
+        self.launches = 0
+        self.crashes = 0
+        self.consecutive_crashes = 0
+        self.last_exit_code = None
+        self.last_exit_at = None
+        self.launched_at = None
+        self.backoff = 0.0
+        self.window_latencies = []
+        self.history = []
+        self._generation = 0
+        self._window_ready = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.RLock()
+        self.tabs = KioskTabs()
+        self.last_refresh = None
+        self.deferred = []
+        self.deferred_reopened = 0
+        self._retry_thread = None
+
+    def start(self, wait_window=False):
+        """Lança o browser (se não estiver rodando); com wait_window, espera a janela"""
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                if not self._launch():
+                    return None
+            ready = self._window_ready
+        if wait_window:
+            return ready.wait(BROWSER_WINDOW_TIMEOUT + 1) and self.state == 'running'
+        return True
+
+    def restart(self, reason='manual'):
+        with self._lock:
+            self.stop()
+            self._record(reason, delay=0)
+            return self._launch()
+
+    def refresh(self, urls=None, reload=False):
+        """Aplica a lista de URLs às abas via CDP; se o DevTools não responder, relança.
+        Retorna o resumo com o modo usado (cdp, relaunch ou skipped)."""
+        if urls is None:
+            urls = [format_url(url.strip()) for url in load_autostart_urls() if url.strip()]
+        start = time.perf_counter()
+        with self._lock:
+            try:
+                summary = {'mode': 'cdp', **self.tabs.apply(self.reachable_urls(urls), reload)}
+            except (CdpError, OSError, ValueError, KeyError) as e:
+                if self.state == 'stopped' and not chromium_pids():
+                    summary = {'mode': 'skipped', 'reason': 'Browser não está rodando'}
+                else:
+                    print(f"⚠️ Atualização via DevTools falhou ({e}); relançando o browser")
+                    summary = {'mode': 'relaunch', 'reason': str(e), 'launched': self.restart('cdp_fallback')}
+            summary['took_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            self.last_refresh = {'at': datetime.now().isoformat(timespec='seconds'), **summary}
+            return summary
+
+    def stop(self):
+        """Encerra o browser supervisionado (ou qualquer chromium, se não houver um)"""
+        with self._lock:
+            self._generation += 1
+            self._wakeup.set()
+            process, self.process = self.process, None
+            self.state = 'stopped'
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(BROWSER_STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+        elif chromium_pids():
+            # Chromium que não foi lançado por nós (ex.: app reiniciado)
+            run_privileged(['pkill', '-f', 'chromium'])
+        if not wait_until(lambda: not chromium_pids(), BROWSER_STOP_TIMEOUT, interval=0.1):
+            print("⚠️ Ainda há processos chromium após a parada")
+        profile_stager.write_back()
+
+    def _launch(self):
+        urls = [format_url(url.strip()) for url in load_autostart_urls() if url.strip()]
+        if not urls:
+            print("ℹ️ Nenhuma URL configurada no autostart.conf")
+            self.state = 'stopped'
+            return False
+        urls = self.reachable_urls(urls)
+        self._stop_unsupervised()
+        # --user-data-dir: perfil no cartão ou a cópia em RAM (modo tmpfs)
+        cmd = browser_command(['chromium'] + profile_stager.browser_flags() + BROWSER_FLAGS + urls)
+        print(f"🎯 Abrindo {len(urls)} URLs no browser...")
+        self._generation += 1
+        generation = self._generation
+        self._window_ready = threading.Event()
+        self._wakeup.clear()
+        launch_start = time.perf_counter()
+        self.process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            stdin=subprocess.DEVNULL,
+            env=dict(os.environ, DISPLAY=BROWSER_DISPLAY),
+            start_new_session=True
+        )
+        self.launches += 1
+        self.launched_at = time.monotonic()
+        self.tabs.assigned = {}
+        self.state = 'starting'
+        print(f"✅ Browser iniciado com PID {self.process.pid}")
+        threading.Thread(target=self._monitor, args=(self.process, generation), daemon=True, name='browser-monitor').start()
+        threading.Thread(target=self._measure_window, args=(generation, launch_start, self._window_ready),
+                         daemon=True, name='browser-window').start()
+        return True
+
+    def _stop_unsupervised(self):
+        """Encerra Chromium que não é o nosso processo (ex.: deixado por um app anterior).
+        Com o mesmo --user-data-dir, o novo launch só repassaria as URLs a ele e sairia
+        com código 0, e o supervisor ficaria sem o handle do browser de verdade."""
+        stray = chromium_pids()
+        if not stray:
+            return
+        print(f"⚠️ Chromium não supervisionado rodando (PIDs {stray}); encerrando antes do launch")
+        run_privileged(['pkill', '-f', 'chromium'])
+        if not wait_until(lambda: not chromium_pids(), BROWSER_STOP_TIMEOUT, interval=0.1):
+            print("⚠️ Ainda há processos chromium após a parada")
+
+    def reachable_urls(self, urls):
+        """Sonda as URLs e devolve as que estão no ar e as que não dá para sondar (abertas
+        como estão); só as http/https que falharam ficam adiadas e entram nas abas quando a
+        nova sonda em segundo plano as encontrar. Se não sobrar nenhuma, abre about:blank
+        (fechar a última aba encerraria o Chromium)."""
+        if not URL_PROBE_ENABLED or not urls:
+            self.deferred = []
+            return urls
+        try:
+            results = url_prober.probe(urls)
+        except Exception as e:
+            print(f"⚠️ Sonda das URLs falhou ({e}); abrindo todas")
+            self.deferred = []
+            return urls
+        ready = [url for url in urls if results[url]['up'] is not False]
+        self.deferred = [url for url in urls if results[url]['up'] is False]
+        if self.deferred:
+            print(f"⏳ {len(self.deferred)} URL(s) fora do ar, abertas quando responderem: {self.deferred}")
+            if self._retry_thread is None:
+                self._retry_thread = threading.Thread(target=self._retry_deferred, daemon=True, name='url-retry')
+                self._retry_thread.start()
+        return ready or ['about:blank']
+
+    def _retry_deferred(self):
+        """Sonda as URLs adiadas com backoff; quando alguma volta, atualiza as abas via CDP"""
+        delay = URL_RETRY_BASE
+        while True:
+            time.sleep(delay)
+            with self._lock:
+                deferred = list(self.deferred)
+                if not deferred or self.state == 'stopped':
+                    self._retry_thread = None
+                    return
+                # Em backoff, o próximo launch já sonda tudo de novo
+                active = self.state in ('starting', 'running')
+            if not active:
+                continue
+            try:
+                results = url_prober.probe(deferred)
+            except Exception as e:
+                print(f"⚠️ Erro ao sondar URLs adiadas: {e}")
+                results = {}
+            back = [url for url, result in results.items() if result['up']]
+            if back:
+                print(f"🔁 URLs de volta ao ar: {back}")
+                self.deferred_reopened += len(back)
+                self.refresh()
+                delay = URL_RETRY_BASE
+            else:
+                delay = min(delay * 2, URL_RETRY_MAX)
+
+    def _measure_window(self, generation, launch_start, ready):
+        """xdotool search --sync bloqueia até existir uma janela visível do Chromium"""
+        try:
+            result = command_runner.run(
+                browser_command(['xdotool', 'search', '--sync', '--onlyvisible', '--class', 'chromium']),
+                timeout=BROWSER_WINDOW_TIMEOUT, family='display')
+            found = result.returncode == 0
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️ Não foi possível detectar a janela do browser: {e}")
+            found = False
+        with self._lock:
+            if generation == self._generation:
+                if found:
+                    latency = round((time.perf_counter() - launch_start) * 1000)
+                    self.window_latencies = (self.window_latencies + [latency])[-BROWSER_HISTORY:]
+                    print(f"🪟 Janela do browser em {latency} ms")
+                if self.process is not None and self.process.poll() is None:
+                    self.state = 'running'
+        ready.set()
+
+    @staticmethod
+    def _wait_exit(process):
+        """Espera a saída pelo pidfd (Linux 5.3+) ou pelo wait() do próprio handle"""
+        try:
+            fd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            return process.wait()
+        try:
+            select.select([fd], [], [])
+        finally:
+            os.close(fd)
+        return process.wait()
+
+    def _monitor(self, process, generation):
+        exit_code = self._wait_exit(process)
+        with self._lock:
+            if generation != self._generation:
+                return  # parada pedida: não é queda
+            uptime = time.monotonic() - self.launched_at
+            self.process = None
+            self.last_exit_code = exit_code
+            self.last_exit_at = datetime.now().isoformat(timespec='seconds')
+            handoff = exit_code == 0 and uptime < BROWSER_HANDOFF_WINDOW and bool(chromium_pids())
+            if handoff:
+                # Outro Chromium no mesmo perfil recebeu as URLs: não é queda nem motivo
+                # para backoff; o launch espera ele sair
+                self.state = 'external'
+                self._record('handoff', 0, exit_code, uptime)
+            else:
+                self.crashes += 1
+                self.consecutive_crashes = 1 if uptime >= BROWSER_STABLE_AFTER else self.consecutive_crashes + 1
+                self.backoff = min(BROWSER_BACKOFF_BASE * 2 ** (self.consecutive_crashes - 1), BROWSER_BACKOFF_MAX)
+                self.state = 'backoff'
+                self._record('crash', self.backoff, exit_code, uptime)
+                delay = self.backoff
+        if handoff:
+            print(f"🔀 Chromium repassou as URLs a outro processo do mesmo perfil após {uptime:.1f}s")
+            # stop()/restart() enquanto o outro roda cancelam a espera
+            while chromium_pids():
+                if self._wakeup.wait(BROWSER_EXTERNAL_POLL):
+                    return
+        else:
+            print(f"💥 Chromium saiu (código {exit_code}) após {uptime:.0f}s; reiniciando em {delay:.0f}s")
+            # stop()/restart() durante o backoff cancelam este reinício
+            if self._wakeup.wait(delay):
+                return
+        with self._lock:
+            if generation == self._generation:
+                self._launch()
+
+    def _record(self, reason, delay, exit_code=None, uptime=None):
+        self.history = (self.history + [{
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'reason': reason,
+            'delay_s': delay,
+            'exit_code': exit_code,
+            'uptime_s': round(uptime, 1) if uptime is not None else None
+        }])[-BROWSER_HISTORY:]
+
+    def stats(self):
+        with self._lock:
+            process = self.process
+            running = process is not None and process.poll() is None
+            latencies = self.window_latencies
+            return {
+                'state': self.state,
+                'pid': process.pid if running else None,
+                'child_pids': descendant_pids(process.pid) if running else [],
+                'uptime_s': round(time.monotonic() - self.launched_at, 1) if running else None,
+                'launches': self.launches,
+                'crashes': self.crashes,
+                'consecutive_crashes': self.consecutive_crashes,
+                'backoff_s': self.backoff,
+                'last_exit_code': self.last_exit_code,
+                'last_exit_at': self.last_exit_at,
+                'launch_to_window_ms': {
+                    'last': latencies[-1] if latencies else None,
+                    'avg': round(sum(latencies) / len(latencies)) if latencies else None,
+                    'max': max(latencies) if latencies else None,
+                    'samples': list(latencies)
+                },
+                'restarts': list(self.history),
+                'last_refresh': self.last_refresh,
+                'deferred_urls': list(self.deferred),
+                'deferred_reopened': self.deferred_reopened
+            }
+
+browser_supervisor = BrowserSupervisor()
+
+# ========== AMOSTRADOR DE MÉTRICAS ==========
+METRICS_SAMPLE_INTERVAL = 1.0  # segundos entre leituras de /proc e /sys
+
+def read_text_file(path, default=None):
+    """Lê um arquivo pequeno de /proc ou /sys sem criar processos"""
+    try:
+        with open(path, 'r') as f:
+            return f.read()
+    except OSError:
+        return default
+
+def format_uptime(seconds):
+    """Formata o uptime no mesmo estilo de `uptime -p`"""
+    minutes = int(seconds) // 60
+    weeks, minutes = divmod(minutes, 7 * 24 * 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    parts = []
+    for value, unit in ((weeks, 'week'), (days, 'day'), (hours, 'hour'), (minutes, 'minute')):
+        if value:
+            parts.append(f"{value} {unit}{'s' if value != 1 else ''}")
+    return 'up ' + (', '.join(parts) if parts else '0 minutes')
+
+CPU_STAT_FIELDS = 8  # user nice system idle iowait irq softirq steal
+
+class CpuAccounting:
+    """Utilização de CPU por intervalo (agregado e cada cpuN) a partir de deltas do /proc/stat.
+
+    Os contadores anterior/atual e os resultados ficam em arrays pré-alocados que
+    são reaproveitados a cada amostra; só há realocação se o número de núcleos mudar.
+    """
+    BREAKDOWN = ('total', 'user', 'system', 'iowait', 'irq', 'steal')
+
+    def __init__(self, stat_path='/proc/stat'):
+        self.stat_path = stat_path
+        self.samples = 0
+        self.rows = 0
+        self._file = None
+        self._buffer = bytearray(8192)
+        self._prev = self._cur = self.usage = None
+        self._lock = threading.Lock()
+
+    def _allocate(self, rows):
+        self.rows = rows
+        self._prev = array('Q', bytes(8 * rows * CPU_STAT_FIELDS))
+        self._cur = array('Q', bytes(8 * rows * CPU_STAT_FIELDS))
+        self.usage = array('d', bytes(8 * rows * len(self.BREAKDOWN)))
+
+    def _read(self):
+        if self._file is None:
+            self._file = open(self.stat_path, 'rb', buffering=0)
+        self._file.seek(0)
+        # As linhas cpu vêm primeiro; o resto do arquivo (intr, softirq...) é ignorado
+        return self._file.readinto(self._buffer)
+
+    def sample(self):
+        """Lê /proc/stat e atualiza self.usage com as porcentagens do intervalo"""
+        with self._lock:
+            buffer = self._buffer
+            length = self._read()
+            rows = 0
+            start = 0
+            lines = []
+            while True:
+                end = buffer.find(b'\n', start, length)
+                if end < 0 or not buffer.startswith(b'cpu', start):
+                    break
+                lines.append((start, end))
+                rows += 1
+                start = end + 1
+            if rows != self.rows:
+                self._allocate(rows)
+            cur, prev, usage = self._cur, self._prev, self.usage
+            width = len(self.BREAKDOWN)
+            for row, (line_start, line_end) in enumerate(lines):
+                fields = buffer[line_start:line_end].split()
+                base = row * CPU_STAT_FIELDS
+                for i in range(CPU_STAT_FIELDS):
+                    cur[base + i] = int(fields[i + 1]) if i + 1 < len(fields) else 0
+
+                user, nice, system, idle, iowait, irq, softirq, steal = (
+                    max(0, cur[base + i] - prev[base + i]) for i in range(CPU_STAT_FIELDS)
+                )
+                total = user + nice + system + idle + iowait + irq + softirq + steal
+                out = row * width
+                if total > 0:
+                    scale = 100.0 / total
+                    usage[out] = (total - idle - iowait) * scale
+                    usage[out + 1] = (user + nice) * scale
+                    usage[out + 2] = system * scale
+                    usage[out + 3] = iowait * scale
+                    usage[out + 4] = (irq + softirq) * scale
+                    usage[out + 5] = steal * scale
+            # Troca os buffers: o atual vira o anterior da próxima amostra
+            self._prev, self._cur = cur, prev
+            self.samples += 1
+
+    def as_dict(self):
+        """Resumo serializável: agregado e por núcleo"""
+        width = len(self.BREAKDOWN)
+        usage = self.usage
+        if usage is None:
+            return {'total': None, 'cores': []}
+
+        def row_dict(row):
+            return {name: round(usage[row * width + i], 1) for i, name in enumerate(self.BREAKDOWN)}
+
+        return {
+            'total': row_dict(0),
+            'cores': [dict(row_dict(row), cpu=f"cpu{row - 1}") for row in range(1, self.rows)]
+        }
+
+cpu_accounting = CpuAccounting()
+
+class SnapshotBroadcaster:
+    """Distribui o mesmo evento SSE, serializado uma vez, para todos os assinantes"""
+    def __init__(self, heartbeat=15):
+        self.heartbeat = heartbeat
+        self.subscribers = 0
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._event = b''
+
+    def publish(self, payload):
+        event = b'data: ' + payload + b'\n\n'
+        with self._cond:
+            self._seq += 1
+            self._event = event
+            self._cond.notify_all()
+
+    def stream(self):
+        """Gerador por cliente: só espera e repassa os bytes publicados pelo produtor"""
+        with self._cond:
+            self.subscribers += 1
+            seq, event = self._seq, self._event
+        try:
+            yield b'retry: 3000\n\n'
+            if event:
+                yield event
+            while True:
+                with self._cond:
+                    if self._cond.wait_for(lambda: self._seq != seq, timeout=self.heartbeat):
+                        seq, event = self._seq, self._event
+                    else:
+                        event = None
+                # Comentário SSE mantém a conexão viva em proxies (nginx)
+                yield event if event else b': keepalive\n\n'
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+system_stream = SnapshotBroadcaster()
+
+class MetricsSampler:
+    """Thread única que lê /proc e /sys em intervalo fixo e mantém o último snapshot em memória"""
+    def __init__(self, interval=METRICS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.model = None
+        self._snapshot = {}
+        self._payload = b'{}'
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._net_previous = None
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            # Primeira leitura síncrona para que a API nunca responda vazia
+            self.sample()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='metrics-sampler', daemon=True)
+            self._thread.start()
+            print(f"📊 Amostrador de métricas iniciado (intervalo {self.interval}s)")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"⚠️ Erro no amostrador de métricas: {e}")
+
+    def read_model(self):
+        """O modelo não muda em tempo de execução, então é lido uma única vez"""
+        if self.model is None:
+            model = read_text_file('/proc/device-tree/model', '')
+            self.model = model.strip('\x00\n ') or "Raspberry Pi"
+        return self.model
+
+    def read_network_bytes(self):
+        """Soma de bytes recebidos/enviados em todas as interfaces exceto loopback"""
+        rx_total = tx_total = 0
+        with open('/proc/net/dev', 'r') as f:
+            for line in f:
+                if ':' not in line:
+                    continue
+                iface, counters = line.split(':', 1)
+                if iface.strip() == 'lo':
+                    continue
+                fields = counters.split()
+                rx_total += int(fields[0])
+                tx_total += int(fields[8])
+        return rx_total, tx_total
+
+    def read_network_rates(self, now):
+        """Taxa em bytes/s desde a amostra anterior"""
+        try:
+            rx_total, tx_total = self.read_network_bytes()
+        except (OSError, ValueError, IndexError):
+            return float('nan'), float('nan')
+        previous = self._net_previous
+        self._net_previous = (now, rx_total, tx_total)
+        if previous is None or now <= previous[0]:
+            return float('nan'), float('nan')
+        elapsed = now - previous[0]
+        return max(0, rx_total - previous[1]) / elapsed, max(0, tx_total - previous[2]) / elapsed
+
+    def read_temperature(self):
+        raw = read_text_file('/sys/class/thermal/thermal_zone0/temp', '').strip()
+        if not raw:
+            return None
+        try:
+            return int(raw) / 1000.0
+        except ValueError:
+            return None
+
+    def sample(self):
+        """Faz uma leitura completa, publica o novo snapshot e alimenta o histórico"""
+        now = time.time()
+        hostname = (read_text_file('/proc/sys/kernel/hostname', '') or '').strip() or "N/A"
+        uptime_raw = read_text_file('/proc/uptime')
+        uptime = format_uptime(float(uptime_raw.split()[0])) if uptime_raw else "N/A"
+        temp_c = self.read_temperature()
+        cpu_accounting.sample()
+        snapshot = {
+            'hostname': hostname,
+            'model': self.read_model(),
+            'uptime': uptime,
+            'temperature': f"{temp_c:.1f}°C" if temp_c is not None else "N/A",
+            'cpu_usage': get_cpu_usage(),
+            'cpu': cpu_accounting.as_dict(),
+            'memory_usage': get_memory_usage(),
+            'timestamp': now
+        }
+        # Serializa uma única vez por ciclo; os clientes recebem os bytes prontos
+        payload = json.dumps(snapshot).encode('utf-8')
+        self._snapshot, self._payload = snapshot, payload
+        system_stream.publish(payload)
+
+        try:
+            mem_total, mem_available = read_meminfo()
+            memory = (mem_total - mem_available) * 100.0 / mem_total if mem_total else float('nan')
+        except (OSError, ValueError):
+            memory = float('nan')
+        rx_rate, tx_rate = self.read_network_rates(now)
+        metrics_history.append(now, (
+            cpu_accounting.usage[0],
+            memory,
+            temp_c if temp_c is not None else float('nan'),
+            rx_rate,
+            tx_rate
+        ))
+        metrics_history.maybe_flush()
+        return snapshot
+
+    def snapshot(self):
+        return self._snapshot
+
+    def payload(self):
+        return self._payload
+
+metrics_sampler = MetricsSampler()
+
+# ========== HISTÓRICO DE MÉTRICAS ==========
+HISTORY_METRICS = ('cpu', 'memory', 'temperature', 'net_rx', 'net_tx')
+# (nome, resolução em segundos, capacidade): 1h em 1s, 24h em 1min, 30 dias em 1h
+HISTORY_TIERS = (('1s', 1, 3600), ('1min', 60, 24 * 60), ('1h', 3600, 30 * 24))
+HISTORY_MAGIC = b'PIMHIST1'
+HISTORY_HEADER_SIZE = 64
+HISTORY_RANGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Intervalo entre gravações do histórico no arquivo (segundos); menos escritas = menos desgaste do SD
+HISTORY_FLUSH_INTERVAL = int(os.environ.get('PI_MANAGER_HISTORY_FLUSH_INTERVAL', '300'))
+
+class MetricsHistory:
+    """Histórico em buffers circulares de tamanho fixo, com camadas agregadas de 1s/1min/1h.
+
+    Todo o estado vive num único buffer contíguo (cabeçalho + uma matriz de doubles por
+    camada, linha = timestamp + métricas), acessado via memoryview. Nenhuma amostra vira
+    dict e o consumo de memória é fixo, definido por HISTORY_TIERS.
 
-def sync_chromium_favorites():
-    """Sincroniza os favoritos do Chromium com as URLs configuradas em TODOS os perfis"""
-    try:
-        urls = load_autostart_urls()
-        if not urls:
-            print("ℹ️ Nenhuma URL configurada para sincronizar favoritos")
-            return False, "Nenhuma URL configurada"
-        
-        # Formata URLs
-        formatted_urls = [format_url(url.strip()) for url in urls if url.strip()]
-        print(f"🔄 URLs para sincronizar: {formatted_urls}")
-        
-        # Sincroniza em TODOS os perfis
-        success, message = favorites_manager.sync_to_all_profiles(formatted_urls)
-        
-        if success:
-            print(f"✅ Favoritos sincronizados em todos os perfis")
-        else:
-            print(f"⚠️ Aviso: {message}")
-        
-        return success, message
-        
-    except Exception as e:
-        print(f"❌ Erro na sincronização de favoritos: {e}")
-        return False, str(e)
-    
-def open_browser_with_urls():
-    """Abre o browser com URLs configuradas e perfil específico"""
-    time.sleep(10)  # Aguarda mais tempo para sistema estar pronto
-    
-    try:
-        # 1. Primeiro garante que os favoritos estão sincronizados
-        print("🔄 Sincronizando favoritos antes de abrir browser...")
-        success, message = sync_chromium_favorites()
-        print(f"📋 Resultado da sincronização: {message}")
-        
-        # 2. Carrega URLs
-        urls = load_autostart_urls()
-        if not urls:
-            print("ℹ️ Nenhuma URL configurada no autostart.conf")
+    O arquivo tem o mesmo layout do buffer. O buffer de trabalho fica em memória anônima
+    (um mapeamento compartilhado seria gravado pelo kernel a cada ~30s) e só as linhas
+    alteradas voltam ao arquivo, com pwrite, a cada flush_interval e no desligamento.
+    """
+    def __init__(self, buffer=None, flush_interval=HISTORY_FLUSH_INTERVAL):
+        self.width = 1 + len(HISTORY_METRICS)
+        if buffer is None:
+            buffer = bytearray(self.required_size())
+        self.flush_interval = flush_interval
+        self.path = None
+        self._fd = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = [0] * len(HISTORY_TIERS)  # linhas gravadas por camada desde o último flush
+        self._dirty_all = False
+        tiers = len(HISTORY_TIERS)
+        # Acumuladores das camadas agregadas (soma e contagem por métrica, bucket atual)
+        self._acc_sum = array('d', bytes(8 * tiers * self.width))
+        self._acc_count = array('q', bytes(8 * tiers * self.width))
+        self._acc_bucket = array('q', [-1] * tiers)
+        self._attach(buffer)
+
+    @classmethod
+    def open(cls, path, flush_interval=HISTORY_FLUSH_INTERVAL):
+        history = cls(flush_interval=flush_interval)
+        history.load(path)
+        return history
+
+    def load(self, path):
+        """Carrega o histórico de um arquivo pré-alocado com o layout do buffer.
+
+        Carregar é uma única leitura, sem parsing. Em caso de erro (SD somente leitura,
+        etc.) o histórico segue só em memória.
+        """
+        size = self.required_size()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size != size:
+                    # Arquivo novo ou layout diferente: recria com blocos reservados
+                    os.ftruncate(fd, 0)
+                    try:
+                        os.posix_fallocate(fd, 0, size)
+                    except (AttributeError, OSError):
+                        os.ftruncate(fd, size)
+                    data = None
+                else:
+                    data = os.pread(fd, size, 0)
+            except OSError:
+                os.close(fd)
+                raise
+        except OSError as e:
+            print(f"⚠️ Histórico de métricas sem persistência ({path}): {e}")
+            return self
+        with self._lock:
+            if data is not None and len(data) == size:
+                memoryview(self.buffer)[:size] = data
+            self._dirty = [0] * len(HISTORY_TIERS)
+            self._dirty_all = data is None
+            if bytes(self.buffer[:len(HISTORY_MAGIC)]) != HISTORY_MAGIC:
+                self.reset()
+            self._fd = fd
+            self.path = path
+        print(f"📈 Histórico de métricas carregado de {path}")
+        return self
+
+    def _dirty_ranges(self):
+        """(offset, bytes) a gravar: cabeçalho e, por camada, as linhas escritas desde o
+        último flush (dois trechos quando o anel dá a volta)"""
+        view = memoryview(self.buffer)
+        if self._dirty_all:
+            return [(0, bytes(view[:self.required_size()]))]
+        ranges = [(0, bytes(view[:HISTORY_HEADER_SIZE]))]
+        row = self.width * 8
+        for tier, (_, _, capacity) in enumerate(HISTORY_TIERS):
+            written = min(self._dirty[tier], capacity)
+            if not written:
+                continue
+            start = (self._header[2 * tier] - written) % capacity
+            for first, count in ((start, min(written, capacity - start)), (0, max(0, start + written - capacity))):
+                if count:
+                    offset = self._tier_offsets[tier] + first * row
+                    ranges.append((offset, bytes(view[offset:offset + count * row])))
+        return ranges
+
+    def flush(self):
+        """Grava no arquivo só os trechos alterados (no-op em memória)"""
+        self._last_flush = time.monotonic()
+        if self._fd is None:
             return
-        
-        print(f"🎯 Abrindo {len(urls)} URLs no browser...")
-        
-        # 3. Comando para abrir Chromium COM DIRETÓRIO DE PERFIL ESPECÍFICO
-        cmd = [
-            'sudo', '-u', 'administrador',
-            'env', 'DISPLAY=:0',
-            'chromium',
-            '--user-data-dir=/home/administrador/chromium-profile',  # DIRETÓRIO ESPECÍFICO
-            '--no-first-run',
-            '--start-maximized',
-            '--ignore-certificate-errors',
-            '--noerrdialogs',
-            '--disable-session-crashed-bubble'
-        ]
-        
-        # Adiciona URLs
-        for url in urls:
-            if url.strip():
-                formatted_url = format_url(url.strip())
-                cmd.append(formatted_url)
-        
-        print(f"🚀 Executando com perfil específico: {' '.join(cmd[:10])}...")
-        
-        # Executa em background
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-            stdin=subprocess.DEVNULL
-        )
-        
-        print(f"✅ Browser iniciado com PID {process.pid}")
-        
-        # Verifica se realmente abriu
-        time.sleep(3)
-        result = subprocess.run(['pgrep', '-f', 'chromium'], capture_output=True, text=True)
-        if result.stdout.strip():
-            print(f"✅ Chromium está rodando (PIDs: {result.stdout.strip()})")
-        else:
-            print("⚠️ Chromium pode não ter iniciado corretamente")
-        
-    except Exception as e:
-        print(f"❌ Erro ao abrir browser: {e}")
-        import traceback
-        traceback.print_exc()
+        with self._flush_lock:
+            # Cópia sob o lock; a escrita no SD fica fora dele para não travar o amostrador
+            with self._lock:
+                ranges = self._dirty_ranges()
+                self._dirty = [0] * len(HISTORY_TIERS)
+                self._dirty_all = False
+            try:
+                for offset, data in ranges:
+                    os.pwrite(self._fd, data, offset)
+                os.fdatasync(self._fd)
+            except OSError as e:
+                print(f"⚠️ Erro ao gravar histórico de métricas: {e}")
+                with self._lock:
+                    self._dirty_all = True
+
+    def maybe_flush(self):
+        if self.flush_interval > 0 and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    @classmethod
+    def required_size(cls):
+        width = 1 + len(HISTORY_METRICS)
+        return HISTORY_HEADER_SIZE + sum(capacity * width * 8 for _, _, capacity in HISTORY_TIERS)
+
+    def _attach(self, buffer):
+        if len(buffer) < self.required_size():
+            raise ValueError("Buffer de histórico menor que o necessário")
+        self.buffer = buffer
+        view = memoryview(buffer)
+        # Cabeçalho: magic + (head, count) por camada
+        self._header = view[len(HISTORY_MAGIC):len(HISTORY_MAGIC) + 16 * len(HISTORY_TIERS)].cast('q')
+        self._tiers = []
+        self._tier_offsets = []
+        offset = HISTORY_HEADER_SIZE
+        for _, _, capacity in HISTORY_TIERS:
+            length = capacity * self.width * 8
+            self._tiers.append(view[offset:offset + length].cast('d'))
+            self._tier_offsets.append(offset)
+            offset += length
+        if bytes(view[:len(HISTORY_MAGIC)]) != HISTORY_MAGIC:
+            self.reset()
+
+    def reset(self):
+        view = memoryview(self.buffer)
+        view[:HISTORY_HEADER_SIZE] = bytes(HISTORY_HEADER_SIZE)
+        view[:len(HISTORY_MAGIC)] = HISTORY_MAGIC
+        self._dirty_all = True
+
+    def _push(self, tier, timestamp, values, offset=0):
+        """Grava uma linha na camada; values[offset:offset + len(HISTORY_METRICS)]"""
+        capacity = HISTORY_TIERS[tier][2]
+        data = self._tiers[tier]
+        head = self._header[2 * tier]
+        base = head * self.width
+        data[base] = timestamp
+        for i in range(self.width - 1):
+            data[base + 1 + i] = values[offset + i]
+        self._header[2 * tier] = (head + 1) % capacity
+        self._header[2 * tier + 1] = min(self._header[2 * tier + 1] + 1, capacity)
+        self._dirty[tier] += 1
+
+    def append(self, timestamp, values):
+        """Adiciona uma amostra bruta e alimenta as camadas agregadas (média por bucket)"""
+        width = self.width
+        with self._lock:
+            self._push(0, timestamp, values)
+            for tier in range(1, len(HISTORY_TIERS)):
+                resolution = HISTORY_TIERS[tier][1]
+                bucket = int(timestamp // resolution)
+                base = tier * width
+                if self._acc_bucket[tier] != bucket:
+                    if self._acc_bucket[tier] >= 0:
+                        # Fecha o bucket anterior: soma vira média (NaN se não houve leitura)
+                        for i in range(1, width):
+                            count = self._acc_count[base + i]
+                            self._acc_sum[base + i] = self._acc_sum[base + i] / count if count else float('nan')
+                        self._push(tier, float(self._acc_bucket[tier] * resolution), self._acc_sum, base + 1)
+                    self._acc_bucket[tier] = bucket
+                    for i in range(width):
+                        self._acc_sum[base + i] = 0.0
+                        self._acc_count[base + i] = 0
+                for i, value in enumerate(values):
+                    if value == value:  # ignora NaN
+                        self._acc_sum[base + 1 + i] += value
+                        self._acc_count[base + 1 + i] += 1
+
+    def pick_tier(self, seconds):
+        """Menor camada cuja janela cobre o intervalo pedido"""
+        for tier, (_, resolution, capacity) in enumerate(HISTORY_TIERS):
+            if resolution * capacity >= seconds:
+                return tier
+        return len(HISTORY_TIERS) - 1
+
+    def query(self, metric, seconds, now=None):
+        """Retorna (resolução, [[timestamp, valor], ...]) do mais antigo para o mais recente"""
+        column = 1 + HISTORY_METRICS.index(metric)
+        now = time.time() if now is None else now
+        since = now - seconds
+        tier = self.pick_tier(seconds)
+        name, _, capacity = HISTORY_TIERS[tier]
+        points = []
+        with self._lock:
+            data = self._tiers[tier]
+            head = self._header[2 * tier]
+            count = self._header[2 * tier + 1]
+            row = head
+            for _ in range(count):
+                row = (row - 1) % capacity
+                base = row * self.width
+                timestamp = data[base]
+                if timestamp < since:
+                    break
+                value = data[base + column]
+                points.append([timestamp, round(value, 2) if value == value else None])
+        points.reverse()
+        return name, points
+
+def parse_history_range(value):
+    """Converte '90s', '10m', '1h', '7d' ou segundos puros em segundos"""
+    value = (value or '1h').strip().lower()
+    match = re.match(r'^(\d+)([smhd]?)$', value)
+    if not match:
+        raise ValueError(f"Intervalo inválido: {value}")
+    seconds = int(match.group(1)) * HISTORY_RANGE_UNITS.get(match.group(2) or 's')
+    if seconds <= 0:
+        raise ValueError(f"Intervalo inválido: {value}")
+    return seconds
+
+# Só em memória até start_app() carregar o arquivo
+metrics_history = MetricsHistory()
 
 # ========== ROTAS ==========
 @app.route('/')
@@ -586,11 +2973,9 @@ def login():
     if request.method == 'POST':
         password = request.form.get('password')
         try:
-            result = subprocess.run(
+            result = command_runner.run(
                 ['sudo', '-k', '-S', 'echo', 'success'],
-                input=password + '\n',
-                text=True,
-                capture_output=True
+                input=password + '\n'
             )
             if result.returncode == 0:
                 session['authenticated'] = True
@@ -630,31 +3015,53 @@ def get_system_info():
     if not check_auth():
         return jsonify({'error': 'Não autenticado'}), 401
     try:
-        hostname_result = subprocess.run(['hostname'], capture_output=True, text=True)
-        hostname = hostname_result.stdout.strip() if hostname_result.returncode == 0 else "N/A"
-        model_result = subprocess.run(['cat', '/proc/device-tree/model'], capture_output=True, text=True)
-        model = model_result.stdout.strip() if model_result.returncode == 0 else "Raspberry Pi"
-        uptime_result = subprocess.run(['uptime', '-p'], capture_output=True, text=True)
-        uptime = uptime_result.stdout.strip() if uptime_result.returncode == 0 else "N/A"
-        temp_result = subprocess.run(['cat', '/sys/class/thermal/thermal_zone0/temp'], capture_output=True, text=True)
-        if temp_result.returncode == 0 and temp_result.stdout.strip():
-            temp_c = int(temp_result.stdout.strip()) / 1000.0
-            temperature = f"{temp_c:.1f}°C"
-        else:
-            temperature = "N/A"
-        cpu_usage = get_cpu_usage()
-        memory_usage = get_memory_usage()
+        # Servido a partir do último snapshot do amostrador, sem subprocessos
+        metrics_sampler.start()
+        return app.response_class(metrics_sampler.payload(), mimetype='application/json')
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stream/system')
+def stream_system_info():
+    """Server-Sent Events com os snapshots do amostrador"""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    metrics_sampler.start()
+    return app.response_class(
+        system_stream.stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/system/history')
+def get_system_history():
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    metric = request.args.get('metric', 'cpu')
+    if metric not in HISTORY_METRICS:
+        return jsonify({'error': f'Métrica inválida. Use: {", ".join(HISTORY_METRICS)}'}), 400
+    try:
+        seconds = parse_history_range(request.args.get('range'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        resolution, points = metrics_history.query(metric, seconds)
         return jsonify({
-            'hostname': hostname,
-            'model': model,
-            'uptime': uptime,
-            'temperature': temperature,
-            'cpu_usage': cpu_usage,
-            'memory_usage': memory_usage
+            'metric': metric,
+            'range': seconds,
+            'resolution': resolution,
+            'points': points
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/system/commands/stats')
+def get_command_stats():
+    """Latência e falhas dos comandos externos executados pelo app"""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    return jsonify(command_runner.stats())
+
 @app.route('/api/system/hostname', methods=['POST'])
 def change_hostname():
     if not check_auth():
@@ -666,9 +3073,7 @@ def change_hostname():
             return jsonify({'error': 'Hostname deve ter pelo menos 2 caracteres'}), 400
         if not re.match(r'^[a-zA-Z0-9-]{1,63}$', new_hostname):
             return jsonify({'error': 'Hostname inválido. Use apenas letras, números e hífens'}), 400
-        subprocess.run(['sudo', 'hostnamectl', 'set-hostname', new_hostname], capture_output=True, text=True)
-        subprocess.run(['sudo', 'sed', '-i', f's/.*/{new_hostname}/', '/etc/hostname'], capture_output=True, text=True)
-        subprocess.run(['sudo', 'sed', '-i', f's/127.0.1.1.*/127.0.1.1\\t{new_hostname}/', '/etc/hosts'], capture_output=True, text=True)
+        set_hostname_privileged(new_hostname)
         return jsonify({'success': True, 'message': 'Hostname alterado com sucesso. Reinicie o sistema para aplicar completamente.'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -682,7 +3087,11 @@ def change_password():
     try:
         if not new_password or len(new_password) < 3:
             return jsonify({'error': 'Senha deve ter pelo menos 3 caracteres'}), 400
-        result = subprocess.run(['sudo', 'chpasswd'], input=f'administrador:{new_password}', text=True, capture_output=True)
+        if len(new_password) > PASSWORD_MAX_LENGTH:
+            return jsonify({'error': f'Senha deve ter no máximo {PASSWORD_MAX_LENGTH} caracteres'}), 400
+        if '\n' in new_password or '\r' in new_password:
+            return jsonify({'error': 'Senha não pode conter quebras de linha'}), 400
+        result = run_privileged(['chpasswd'], input=f'administrador:{new_password}')
         if result.returncode == 0:
             return jsonify({'success': True, 'message': 'Senha alterada com sucesso'})
         else:
@@ -695,7 +3104,9 @@ def reboot_system():
     if not check_auth():
         return jsonify({'error': 'Não autenticado'}), 401
     try:
-        subprocess.run(['sudo', 'shutdown', '-r', '+1'], capture_output=True)
+        metrics_history.flush()
+        profile_stager.write_back()
+        run_privileged(['shutdown', '-r', '+1'])
         return jsonify({'success': True, 'message': 'Sistema será reiniciado em 1 minuto'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -705,7 +3116,9 @@ def shutdown_system():
     if not check_auth():
         return jsonify({'error': 'Não autenticado'}), 401
     try:
-        subprocess.run(['sudo', 'shutdown', '-h', '+1'], capture_output=True)
+        metrics_history.flush()
+        profile_stager.write_back()
+        run_privileged(['shutdown', '-h', '+1'])
         return jsonify({'success': True, 'message': 'Sistema será desligado em 1 minuto'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -715,7 +3128,9 @@ def reboot_now():
     if not check_auth():
         return jsonify({'error': 'Não autenticado'}), 401
     try:
-        subprocess.run(['sudo', 'shutdown', '-r', 'now'], capture_output=True)
+        metrics_history.flush()
+        profile_stager.write_back()
+        run_privileged(['shutdown', '-r', 'now'])
         return jsonify({'success': True, 'message': 'Reiniciando agora...'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -725,60 +3140,273 @@ def shutdown_now():
     if not check_auth():
         return jsonify({'error': 'Não autenticado'}), 401
     try:
-        subprocess.run(['sudo', 'shutdown', '-h', 'now'], capture_output=True)
+        metrics_history.flush()
+        profile_stager.write_back()
+        run_privileged(['shutdown', '-h', 'now'])
         return jsonify({'success': True, 'message': 'Desligando agora...'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ========== SERVIÇO DE ESTADO DA REDE ==========
+# TTL (segundos) dos resultados do nmcli em cache
+NETWORK_CACHE_TTL = {'connections': 5, 'devices': 5, 'wifi': 15}
+NMCLI_FIELD_SEPARATOR = re.compile(r'(?<!\\):')
+
+class SingleFlightCache:
+    """Cache com TTL em que chamadas concorrentes pela mesma chave compartilham uma única execução"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}    # chave -> (expira_em, valor)
+        self._inflight = {}  # chave -> Future da execução em andamento
+        self._generation = 0
+
+    def get(self, key, loader, ttl):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+                generation = self._generation
+        if not owner:
+            return future.result()
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._forget_inflight(key, future)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._forget_inflight(key, future)
+            # Resultado iniciado antes de uma invalidação não entra no cache
+            if generation == self._generation:
+                self._values[key] = (time.monotonic() + ttl, value)
+        future.set_result(value)
+        return value
+
+    def _forget_inflight(self, key, future):
+        # Depois de uma invalidação a chave pode já ter outra execução em andamento
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def invalidate(self, *keys):
+        """Descarta os valores e desliga as execuções em andamento: quem chegar depois
+        começa uma nova em vez de receber o estado de antes da mudança"""
+        with self._lock:
+            self._generation += 1
+            if keys:
+                for key in keys:
+                    self._values.pop(key, None)
+                    self._inflight.pop(key, None)
+            else:
+                self._values.clear()
+                self._inflight.clear()
+
+class NetworkStateService:
+    """Estado da rede via nmcli com cache curto e execução única por consulta"""
+    def __init__(self, ttl=NETWORK_CACHE_TTL):
+        self.ttl = ttl
+        self.cache = SingleFlightCache()
+
+    def connections(self):
+        return self.cache.get('connections', nmcli_active_connections, self.ttl['connections'])
+
+    def devices(self):
+        return self.cache.get('devices', nmcli_device_addresses, self.ttl['devices'])
+
+    def wifi_networks(self):
+        return self.cache.get('wifi', nmcli_wifi_list, self.ttl['wifi'])
+
+    def invalidate(self):
+        """Chamado logo após qualquer alteração feita via nmcli"""
+        self.cache.invalidate()
+
+network_state = NetworkStateService()
+
+# ========== BUSCA DE REDES WI-FI ==========
+# Intervalo de rebusca em segundo plano (segundos); 0 desativa
+WIFI_RESCAN_INTERVAL = int(os.environ.get('PI_MANAGER_WIFI_RESCAN_INTERVAL', '0'))
+WIFI_SCAN_JOBS_KEPT = 20
+
+class WifiScanService:
+    """Buscas de Wi-Fi como jobs em segundo plano; só uma busca roda por vez"""
+    def __init__(self, rescan_interval=WIFI_RESCAN_INTERVAL):
+        self.rescan_interval = rescan_interval
+        self.jobs = OrderedDict()
+        self.latest = None
+        self._running = None
+        self._lock = threading.Lock()
+        self._background = None
+
+    def start_scan(self):
+        """Inicia uma busca, ou devolve a que já está em andamento"""
+        with self._lock:
+            if self._running:
+                return self._running
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'status': 'running',
+                'started_at': time.time(),
+                'finished_at': None,
+                'error': None
+            }
+            self.jobs[job['id']] = job
+            while len(self.jobs) > WIFI_SCAN_JOBS_KEPT:
+                self.jobs.popitem(last=False)
+            self._running = job
+        threading.Thread(target=self._run, args=(job,), name='wifi-scan', daemon=True).start()
+        return job
+
+    def _run(self, job):
+        try:
+            # Falha do rescan (ex.: limite de frequência do NetworkManager) não impede a listagem
+            run_privileged(['nmcli', 'dev', 'wifi', 'rescan'])
+            network_state.cache.invalidate('wifi')
+            networks = dedupe_wifi_networks(network_state.wifi_networks())
+            with self._lock:
+                self.latest = {'networks': networks, 'scanned_at': time.time(), 'job_id': job['id']}
+                job['status'] = 'done'
+        except Exception as e:
+            with self._lock:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+            print(f"⚠️ Erro na busca de redes Wi-Fi: {e}")
+        finally:
+            with self._lock:
+                job['finished_at'] = time.time()
+                self._running = None
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def latest_result(self):
+        """Último resultado concluído; sem busca ainda, usa a lista que o nmcli já tem"""
+        with self._lock:
+            latest = self.latest
+        if latest is None:
+            latest = {
+                'networks': dedupe_wifi_networks(network_state.wifi_networks()),
+                'scanned_at': None,
+                'job_id': None
+            }
+        return latest
+
+    def start_background(self):
+        if self.rescan_interval <= 0 or (self._background and self._background.is_alive()):
+            return
+        self._background = threading.Thread(target=self._rescan_loop, name='wifi-rescan', daemon=True)
+        self._background.start()
+        print(f"📡 Rebusca de Wi-Fi em segundo plano a cada {self.rescan_interval}s")
+
+    def _rescan_loop(self):
+        while True:
+            self.start_scan()
+            time.sleep(self.rescan_interval)
+
+wifi_scanner = WifiScanService()
+
+def nmcli_active_connections():
+    result = run_privileged(['nmcli', '-t', '-f', 'NAME,DEVICE,TYPE,STATE', 'con', 'show', '--active'])
+    connections = []
+    for line in result.stdout.strip().split('\n'):
+        if line:
+            parts = line.split(':')
+            if len(parts) >= 4:
+                name, device, con_type, state = parts[:4]
+                connections.append({'name': name, 'device': device, 'type': con_type, 'state': state})
+    return connections
+
+def nmcli_device_addresses():
+    ip_result = run_privileged(['nmcli', '-t', '-f', 'IP4,IP6,DEVICE', 'dev', 'show'])
+    devices = []; current_device = {}
+    for line in ip_result.stdout.strip().split('\n'):
+        if line:
+            if line.startswith('IP4'):
+                ip_info = line.split(':',1)[1]
+                if '[' in ip_info:
+                    current_device['ip4'] = ip_info.split('/')[0]
+            elif line.startswith('DEVICE'):
+                if current_device:
+                    devices.append(current_device)
+                current_device = {'device': line.split(':',1)[1]}
+    if current_device:
+        devices.append(current_device)
+    return devices
+
+def collect_network_info():
+    """Executa as duas consultas ao nmcli em paralelo (uma no pool, outra na thread atual)"""
+    devices_future = api_executor.submit(network_state.devices)
+    connections = network_state.connections()
+    return {'connections': connections, 'devices': devices_future.result()}
+
 # ========== API - REDE ==========
 @app.route('/api/network/current')
 def get_network_info():
     if not check_auth():
         return jsonify({'error': 'Não autenticado'}), 401
     try:
-        result = subprocess.run(['sudo', 'nmcli', '-t', '-f', 'NAME,DEVICE,TYPE,STATE', 'con', 'show', '--active'], capture_output=True, text=True)
-        connections = []
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                parts = line.split(':')
-                if len(parts) >= 4:
-                    name, device, con_type, state = parts[:4]
-                    connections.append({'name': name, 'device': device, 'type': con_type, 'state': state})
-        ip_result = subprocess.run(['sudo', 'nmcli', '-t', '-f', 'IP4,IP6,DEVICE', 'dev', 'show'], capture_output=True, text=True)
-        devices = []; current_device = {}
-        for line in ip_result.stdout.strip().split('\n'):
-            if line:
-                if line.startswith('IP4'):
-                    ip_info = line.split(':',1)[1]
-                    if '[' in ip_info:
-                        current_device['ip4'] = ip_info.split('/')[0]
-                elif line.startswith('DEVICE'):
-                    if current_device:
-                        devices.append(current_device)
-                    current_device = {'device': line.split(':',1)[1]}
-        if current_device:
-            devices.append(current_device)
-        return jsonify({'connections': connections, 'devices': devices})
+        return jsonify(collect_network_info())
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def nmcli_wifi_list():
+    result = run_privileged(['nmcli', '-t', '-f', 'SSID,SIGNAL,SECURITY', 'dev', 'wifi', 'list'])
+    networks = []
+    for line in result.stdout.strip().split('\n'):
+        if line:
+            # No modo -t o nmcli escapa ':' dentro do SSID como '\:'
+            parts = [part.replace('\\:', ':') for part in NMCLI_FIELD_SEPARATOR.split(line)]
+            if len(parts) >= 3:
+                ssid, signal, security = parts[0], parts[1], parts[2]
+                networks.append({'ssid': ssid, 'signal': signal, 'security': security})
+    return networks
+
+def dedupe_wifi_networks(networks):
+    """Uma entrada por SSID (o nmcli lista uma por BSSID), mantendo o melhor sinal"""
+    best = {}
+    for network in networks:
+        ssid = network.get('ssid')
+        if not ssid:
+            continue
+        signal = int(network['signal']) if str(network.get('signal', '')).isdigit() else 0
+        if ssid not in best or signal > best[ssid][0]:
+            best[ssid] = (signal, network)
+    return [network for _, network in sorted(best.values(), key=lambda item: -item[0])]
+
 @app.route('/api/network/wifi/list')
 def scan_wifi():
     if not check_auth():
         return jsonify({'error': 'Não autenticado'}), 401
     try:
-        result = subprocess.run(['sudo', 'nmcli', '-t', '-f', 'SSID,SIGNAL,SECURITY', 'dev', 'wifi', 'list'], capture_output=True, text=True)
-        networks = []
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                parts = line.split(':')
-                if len(parts) >= 3:
-                    ssid, signal, security = parts[0], parts[1], parts[2]
-                    networks.append({'ssid': ssid, 'signal': signal, 'security': security})
-        return jsonify({'networks': networks})
+        return jsonify(wifi_scanner.latest_result())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/network/wifi/scan', methods=['POST'])
+def start_wifi_scan():
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    try:
+        job = wifi_scanner.start_scan()
+        return jsonify({'success': True, 'job_id': job['id'], 'status': job['status']}), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/network/wifi/scan/<job_id>')
+def get_wifi_scan(job_id):
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    job = wifi_scanner.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Busca não encontrada'}), 404
+    return jsonify(job)
+
 @app.route('/api/network/configure', methods=['POST'])
 def configure_network():
     if not check_auth():
@@ -789,41 +3417,78 @@ def configure_network():
     try:
         if connection_type == 'wifi':
             ssid = data.get('ssid'); password = data.get('password')
-            cmd = ['sudo', 'nmcli', 'dev', 'wifi', 'connect', ssid]
+            cmd = ['nmcli', 'dev', 'wifi', 'connect', ssid]
             if password: cmd.extend(['password', password])
             if connection_name: cmd.extend(['name', connection_name])
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_privileged(cmd, timeout=60)
         elif connection_type == 'ethernet':
             if connection_name:
-                cmd = ['sudo', 'nmcli', 'con', 'add', 'type', 'ethernet', 'con-name', connection_name, 'ifname', 'eth0']
+                cmd = ['nmcli', 'con', 'add', 'type', 'ethernet', 'con-name', connection_name, 'ifname', 'eth0']
             else:
-                cmd = ['sudo', 'nmcli', 'con', 'add', 'type', 'ethernet', 'ifname', 'eth0']
-            result = subprocess.run(cmd, capture_output=True, text=True)
+                cmd = ['nmcli', 'con', 'add', 'type', 'ethernet', 'ifname', 'eth0']
+            result = run_privileged(cmd)
         elif connection_type == 'static':
             ip_address = data.get('ip_address'); gateway = data.get('gateway'); dns = data.get('dns')
             cmd = [
-                'sudo', 'nmcli', 'con', 'modify', connection_name,
+                'nmcli', 'con', 'modify', connection_name,
                 'ipv4.addresses', ip_address,
                 'ipv4.gateway', gateway,
                 'ipv4.dns', dns,
                 'ipv4.method', 'manual'
             ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_privileged(cmd)
         elif connection_type == 'toggle':
             action = data.get('action', 'up')
-            result = subprocess.run(['sudo', 'nmcli', 'con', action, connection_name], capture_output=True, text=True)
+            result = run_privileged(['nmcli', 'con', action, connection_name])
         else:
             return jsonify({'error': 'Tipo de configuração inválido'}), 400
+        network_state.invalidate()
         if result.returncode == 0:
             if connection_name and connection_type in ('ethernet', 'static'):
-                subprocess.run(['sudo', 'nmcli', 'con', 'down', connection_name], capture_output=True)
-                subprocess.run(['sudo', 'nmcli', 'con', 'up', connection_name], capture_output=True)
+                run_privileged(['nmcli', 'con', 'down', connection_name])
+                run_privileged(['nmcli', 'con', 'up', connection_name])
+                network_state.invalidate()
             return jsonify({'success': True, 'message': 'Rede configurada com sucesso'})
         else:
             return jsonify({'error': result.stderr}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ========== API - DASHBOARD ==========
+@app.route('/api/dashboard')
+def get_dashboard():
+    """Sistema, rede e autostart num único payload para o primeiro carregamento"""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    try:
+        metrics_sampler.start()
+        urls_future = api_executor.submit(load_autostart_urls)
+        try:
+            network = collect_network_info()
+        except Exception as e:
+            network = {'error': str(e)}
+        try:
+            autostart = {'urls': urls_future.result()}
+        except Exception as e:
+            autostart = {'error': str(e)}
+        payload = {
+            'system': metrics_sampler.snapshot(),
+            'network': network,
+            'autostart': autostart
+        }
+        body = json.dumps(payload, sort_keys=True).encode('utf-8')
+        response = app.response_class(body, mimetype='application/json')
+        # ETag fraca e só sobre rede e autostart: o bloco 'system' (CPU, uptime, timestamp)
+        # muda a cada segundo e NÃO é coberto por ela. Um 304 devolve ao navegador o corpo
+        # em cache com um 'system' antigo, que o stream de /api/stream/system substitui logo
+        # em seguida. Por isso a ETag é W/"…": os corpos são equivalentes, não idênticos byte a byte.
+        stable = json.dumps({'network': network, 'autostart': autostart}, sort_keys=True).encode('utf-8')
+        response.set_etag(hashlib.sha1(stable).hexdigest(), weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ========== API - AUTOSTART ==========
 @app.route('/api/autostart/urls', methods=['GET', 'POST'])
 def manage_autostart():
@@ -847,31 +3512,192 @@ def manage_autostart():
                     return jsonify({'error': f'URL ou IP inválido: {url}'}), 400
             
             # Salva URLs
-            with open(AUTOSTART_CONFIG, 'w') as f:
-                for url in urls:
-                    if url.strip():
-                        formatted_url = format_url(url.strip())
-                        f.write(formatted_url + '\n')
+            atomic_write(AUTOSTART_CONFIG, ''.join(
+                format_url(url.strip()) + '\n' for url in urls if url.strip()
+            ))
             
             # Sincroniza favoritos do Chromium
             success, message = sync_chromium_favorites()
             
+            # Troca as abas do kiosk sem relançar o browser (relança só se o DevTools falhar)
+            browser = browser_supervisor.refresh()
+            
             if success:
                 return jsonify({
                     'success': True, 
                     'message': 'URLs salvas e favoritos sincronizados com sucesso',
-                    'sync_message': message
+                    'sync_message': message,
+                    'profiles': favorites_manager.last_sync_results,
+                    'browser': browser
                 })
             else:
                 return jsonify({
                     'success': True, 
                     'message': 'URLs salvas, mas erro ao sincronizar favoritos',
-                    'sync_message': message
+                    'sync_message': message,
+                    'profiles': favorites_manager.last_sync_results,
+                    'browser': browser
                 })
                 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+IMPORT_MAX_LINE = 4096  # caracteres; linhas maiores são recusadas sem ir para a memória toda
+
+class ImportNotApplied(Exception):
+    """Importação sem nenhuma URL aceita: o autostart.conf fica como estava"""
+
+def iter_bounded_lines(text, overlong):
+    """Linhas com no máximo IMPORT_MAX_LINE caracteres. De uma linha maior só o início é
+    lido: o resto é descartado até a quebra de linha, o início fica em overlong
+    (número da linha -> texto) e no lugar dela sai uma linha vazia."""
+    number = 0
+    while True:
+        line = text.readline(IMPORT_MAX_LINE + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > IMPORT_MAX_LINE and not line.endswith(('\n', '\r')):
+            rest = line
+            while rest and not rest.endswith(('\n', '\r')):
+                rest = text.readline(IMPORT_MAX_LINE + 1)
+            overlong[number] = line
+            line = '\n'
+        yield line
+
+def iter_import_entries(stream, is_csv):
+    """(número da linha, entrada) de um corpo text/plain ou CSV, lido em streaming. Uma
+    linha longa demais sai inteira como uma entrada só, maior que IMPORT_MAX_LINE."""
+    text = io.TextIOWrapper(io.BufferedReader(stream), encoding='utf-8', errors='replace', newline='')
+    overlong = {}
+    lines = iter_bounded_lines(text, overlong)
+    if not is_csv:
+        for number, line in enumerate(lines, 1):
+            yield number, overlong.pop(number, None) or line.strip()
+        return
+    reader = csv.reader(lines)
+    start = 1
+    for row in reader:
+        # Campos entre aspas podem ocupar várias linhas: o registro vai de start a line_num
+        rejected = [overlong.pop(number) for number in range(start, reader.line_num + 1) if number in overlong]
+        entry = rejected[0] if rejected else (row[0].strip() if row else '')
+        # Cabeçalho opcional na primeira linha
+        if not (start == 1 and entry.lower() in ('url', 'urls', 'endereco', 'endereço')):
+            yield start, entry
+        start = reader.line_num + 1
+
+@app.route('/api/autostart/import', methods=['POST'])
+def import_autostart_urls():
+    """Importação em lote do autostart.conf a partir de texto (uma URL por linha) ou CSV
+    (primeira coluna). Valida e normaliza numa passada, remove duplicatas mantendo a ordem e
+    responde em NDJSON: uma linha por entrada recusada e um resumo no final.
+    Parâmetros: mode=replace|append, dry_run=1, allow_empty=1 (replace sem nenhuma URL
+    aceita esvazia a lista; sem ele o arquivo não é tocado)."""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    
+    mode = request.args.get('mode', 'replace')
+    if mode not in ('replace', 'append'):
+        return jsonify({'error': 'mode deve ser replace ou append'}), 400
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    allow_empty = request.args.get('allow_empty', '').lower() in ('1', 'true', 'yes')
+    is_csv = request.mimetype in ('text/csv', 'application/csv')
+    
+    def diagnostic(**fields):
+        return json.dumps(fields, ensure_ascii=False) + '\n'
+    
+    def generate():
+        # Depois que a resposta começou não há como devolver 500: o erro vira a última linha
+        try:
+            yield from process()
+        except Exception as e:
+            yield diagnostic(status='error', error=str(e))
+    
+    def process():
+        # Hashes de 8 bytes em vez das próprias URLs: memória mínima por entrada única
+        seen = set()
+        counts = {'lines': 0, 'accepted': 0, 'invalid': 0, 'duplicates': 0, 'blank': 0}
+        
+        def accept(url):
+            key = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+            if key in seen:
+                return False
+            seen.add(key)
+            return True
+        
+        applied, reason = not dry_run, None
+        try:
+            with AtomicWriteBatch() as batch:
+                with (batch.open(AUTOSTART_CONFIG) if not dry_run else io.BytesIO()) as out:
+                    if mode == 'append':
+                        for url in load_autostart_urls():
+                            if accept(url):
+                                out.write(url.encode('utf-8') + b'\n')
+                
+                    for number, entry in iter_import_entries(request.stream, is_csv):
+                        counts['lines'] += 1
+                        if not entry:
+                            counts['blank'] += 1
+                            continue
+                        if len(entry) > IMPORT_MAX_LINE:
+                            error = f'Linha maior que {IMPORT_MAX_LINE} caracteres'
+                        else:
+                            error = url_entry_error(entry)
+                        if error:
+                            counts['invalid'] += 1
+                            yield diagnostic(line=number, status='invalid', entry=entry[:200], error=error)
+                            continue
+                        url = format_url(entry)
+                        if not accept(url):
+                            counts['duplicates'] += 1
+                            yield diagnostic(line=number, status='duplicate', entry=entry, url=url)
+                            continue
+                        counts['accepted'] += 1
+                        out.write(url.encode('utf-8') + b'\n')
+                    
+                    # Erro dentro do with: o temporário é descartado e o arquivo não muda
+                    if not dry_run and counts['accepted'] == 0 and not (mode == 'replace' and allow_empty):
+                        raise ImportNotApplied('Nenhuma URL aceita; autostart.conf não foi alterado')
+        except ImportNotApplied as e:
+            applied, reason = False, str(e)
+        
+        summary = {'status': 'summary', 'mode': mode, 'dry_run': dry_run, 'applied': applied, 'urls': len(seen), **counts}
+        if reason:
+            summary['error'] = reason
+        if applied:
+            success, message = sync_chromium_favorites()
+            summary.update(sync_success=success, sync_message=message)
+        yield diagnostic(**summary)
+    
+    return app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/autostart/health', methods=['GET'])
+def autostart_health():
+    """Alcance de cada URL do autostart.conf, sondadas em paralelo. Com ?cached=1 devolve o
+    resultado da última sonda sem gerar tráfego."""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    
+    try:
+        urls = [format_url(url.strip()) for url in load_autostart_urls() if url.strip()]
+        if request.args.get('cached') == '1':
+            results = url_prober.results
+        else:
+            results = url_prober.probe(urls)
+        entries = [results.get(url, {'url': url, 'up': None, 'status': None, 'error': 'Ainda não sondada'}) for url in urls]
+        return jsonify({
+            'success': True,
+            'total': len(entries),
+            'up': sum(1 for entry in entries if entry['up']),
+            'down': sum(1 for entry in entries if entry['up'] is False),
+            'unprobeable': sum(1 for entry in entries if entry.get('probeable') is False),
+            'urls': entries,
+            'deferred': list(browser_supervisor.deferred),
+            'prober': url_prober.stats()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ========== API - FAVORITOS (NOVA) ==========
 @app.route('/api/favorites/sync', methods=['POST'])
 def sync_favorites():
@@ -882,12 +3708,36 @@ def sync_favorites():
     try:
         success, message = sync_chromium_favorites()
         if success:
-            return jsonify({'success': True, 'message': message})
+            return jsonify({'success': True, 'message': message, 'profiles': favorites_manager.last_sync_results})
         else:
             return jsonify({'error': message}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/favorites/search', methods=['GET'])
+def search_favorites():
+    """Busca favoritos por host e título em todos os perfis"""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), SEARCH_MAX_RESULTS)
+    
+    try:
+        start = time.perf_counter()
+        results = bookmark_search.search(query, limit)
+        return jsonify({
+            'success': True,
+            'query': query,
+            'results': results,
+            'count': len(results),
+            'took_ms': round((time.perf_counter() - start) * 1000, 3)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/favorites/current', methods=['GET'])
 def get_current_favorites():
     """Obtém os favoritos atuais do Chromium"""
@@ -895,11 +3745,22 @@ def get_current_favorites():
         return jsonify({'error': 'Não autenticado'}), 401
     
     try:
-        favorites = favorites_manager.load_current_favorites()
+        # Paginação opcional (?offset=&limit=) e modo só contagem (?count_only=1)
+        offset = request.args.get('offset', 0, type=int)
+        limit = request.args.get('limit', type=int)
+        count_only = request.args.get('count_only', '').lower() in ('1', 'true', 'yes')
+        if offset < 0 or (limit is not None and limit < 0):
+            return jsonify({'error': 'Parâmetros de paginação inválidos'}), 400
+        
+        favorites, total = favorites_manager.current_favorites_page(offset, limit, count_only)
+        if count_only:
+            return jsonify({'success': True, 'count': total})
         return jsonify({
             'success': True,
             'favorites': favorites,
-            'count': len(favorites)
+            'count': total,
+            'offset': offset,
+            'limit': limit
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -913,7 +3774,7 @@ def diagnostic_favorites():
         info = {
             'bookmarks_path': str(favorites_manager.bookmarks_file),
             'bookmarks_exists': favorites_manager.bookmarks_file.exists(),
-            'chromium_dir_exists': favorites_manager.chromium_dir.exists(),
+            'chromium_dir_exists': favorites_manager.chromium_profile_dir.exists(),
             'username': favorites_manager.username,
             'permissions': {}
         }
@@ -929,10 +3790,10 @@ def diagnostic_favorites():
             }
         
         # Carrega favoritos atuais
-        current_favs = favorites_manager.load_current_favorites()
+        sample, total = favorites_manager.current_favorites_page(0, 5)
         info['current_favorites'] = {
-            'count': len(current_favs),
-            'sample': current_favs[:5] if current_favs else []
+            'count': total,
+            'sample': sample
         }
         
         # Carrega URLs configuradas
@@ -941,6 +3802,8 @@ def diagnostic_favorites():
             'count': len(config_urls),
             'urls': config_urls
         }
+        info['parse_cache'] = file_cache.stats()
+        info['watcher'] = config_watcher.status()
         
         return jsonify({'success': True, 'diagnostic': info})
         
@@ -955,33 +3818,22 @@ def get_chromium_profiles():
     
     try:
         profiles = favorites_manager.find_all_profiles()
-        active_profile = favorites_manager.active_profile
+        active_profile = favorites_manager.detect_active_profile()
         
         # Verifica conteúdo de cada perfil
         profiles_info = []
         for profile in profiles:
-            profile_path = favorites_manager.chromium_dir / profile
+            profile_path = favorites_manager.chromium_profile_dir / profile
             bookmarks_file = profile_path / 'Bookmarks'
             has_bookmarks = bookmarks_file.exists()
             bookmarks_count = 0
             
             if has_bookmarks:
                 try:
-                    with open(bookmarks_file, 'r') as f:
-                        data = json.load(f)
-                        # Conta URLs
-                        def count_urls(node):
-                            count = 0
-                            if 'children' in node:
-                                for child in node.get('children', []):
-                                    count += count_urls(child)
-                            elif node.get('type') == 'url':
-                                count += 1
-                            return count
-                        
-                        roots = data.get('roots', {})
-                        for root in roots.values():
-                            bookmarks_count += count_urls(root)
+                    _, data = favorites_manager.load_bookmarks(bookmarks_file)
+                    # Conta URLs de todas as raízes, sem recursão
+                    roots = tuple(data.get('roots', {}))
+                    bookmarks_count = sum(1 for _ in favorites_manager.iter_url_nodes(data, roots))
                 except:
                     bookmarks_count = 0
             
@@ -1017,7 +3869,7 @@ def set_chromium_profile():
     
     try:
         # Verifica se o perfil existe
-        profile_path = favorites_manager.chromium_dir / profile_name
+        profile_path = favorites_manager.chromium_profile_dir / profile_name
         if not profile_path.exists():
             return jsonify({'error': f'Perfil {profile_name} não existe'}), 404
         
@@ -1029,8 +3881,8 @@ def set_chromium_profile():
         if not favorites_manager.bookmarks_file.exists():
             favorites_manager.bookmarks_file.parent.mkdir(parents=True, exist_ok=True)
             empty_structure = favorites_manager.create_bookmarks_structure([])
-            with open(favorites_manager.bookmarks_file, 'w') as f:
-                json.dump(empty_structure, f, indent=2)
+            atomic_write(favorites_manager.bookmarks_file, json.dumps(empty_structure, indent=2),
+                         0o644, favorites_manager.get_user_ids())
         
         return jsonify({
             'success': True,
@@ -1041,6 +3893,35 @@ def set_chromium_profile():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/favorites/backups', methods=['GET'])
+def list_favorites_backups():
+    """Lista os backups de favoritos (opcionalmente de um perfil)"""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    try:
+        backups = favorites_manager.backup_store.entries(request.args.get('profile'))
+        return jsonify({'success': True, 'backups': backups, 'count': len(backups)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/favorites/backups/restore', methods=['POST'])
+def restore_favorites_backup():
+    """Restaura um backup de favoritos num perfil"""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    data = request.json or {}
+    profile = data.get('profile', 'Default')
+    digest = data.get('hash')
+    try:
+        favorites_manager.restore_backup(profile, digest)
+        return jsonify({'success': True, 'message': f'Perfil {profile} restaurado do backup {digest[:12]}'})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/favorites/force-sync', methods=['POST'])
 def force_sync_favorites():
     """Força sincronização completa dos favoritos"""
@@ -1058,14 +3939,13 @@ def force_sync_favorites():
         formatted_urls = [format_url(url.strip()) for url in urls if url.strip()]
         
         # 3. Atualiza diretamente (sem preservar)
-        success, message = favorites_manager.update_favorites(formatted_urls)
+        success, message = favorites_manager.update_favorites(formatted_urls, force=True)
         
         if success:
             # 4. Força recarregamento no Chromium
             try:
                 # Envia sinal para Chromium recarregar favoritos
-                subprocess.run(['sudo', 'pkill', '-HUP', 'chromium'], 
-                              capture_output=True, stderr=subprocess.DEVNULL)
+                run_privileged(['pkill', '-HUP', 'chromium'])
             except:
                 pass
             
@@ -1116,34 +3996,36 @@ def restart_browser():
         # 1. Sincroniza favoritos primeiro
         sync_chromium_favorites()
         
-        # 2. Mata processo do Chromium
-        subprocess.run(['sudo', 'pkill', '-f', 'chromium'], capture_output=True)
-        time.sleep(2)
+        # 2. Com ?soft=1, só recarrega as abas pelo DevTools mantendo o browser aquecido
+        if request.args.get('soft', '').lower() in ('1', 'true', 'yes') and load_autostart_urls():
+            browser = browser_supervisor.refresh(reload=True)
+            if browser['mode'] == 'cdp':
+                return jsonify({'success': True, 'message': 'Abas do browser atualizadas sem reiniciar',
+                                'browser': browser})
+            if browser['mode'] == 'relaunch':
+                return jsonify({'success': True, 'message': 'Browser reiniciado com perfil específico e favoritos sincronizados',
+                                'browser': browser})
         
-        # 3. Reabre com perfil específico
-        urls = load_autostart_urls()
-        if urls:
-            cmd = [
-                'sudo', '-u', 'administrador',
-                'env', 'DISPLAY=:0',
-                'chromium',
-                '--user-data-dir=/home/administrador/chromium-profile',  # DIRETÓRIO ESPECÍFICO
-                '--ignore-certificate-errors',
-                '--start-maximized',
-                '--no-first-run',
-                '--disable-dbus',
-                '--noerrdialogs',
-                '--disable-infobars'
-            ]
-            formatted_urls = [format_url(url) for url in urls if url.strip()]
-            cmd.extend(formatted_urls)
-            subprocess.Popen(cmd)
-            return jsonify({'success': True, 'message': 'Browser reiniciado com perfil específico e favoritos sincronizados'})
+        # 3. Para o Chromium (esperando os processos saírem) e reabre supervisionado
+        if browser_supervisor.restart():
+            return jsonify({'success': True, 'message': 'Browser reiniciado com perfil específico e favoritos sincronizados',
+                            'browser': browser_supervisor.stats()})
         else:
             return jsonify({'success': True, 'message': 'Browser fechado (nenhuma URL configurada)'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/browser/status', methods=['GET'])
+def browser_status():
+    """Estado do supervisor: quedas, reinícios e latência launch -> janela"""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
+    
+    try:
+        return jsonify({'success': True, **browser_supervisor.stats(), 'profile': profile_stager.status()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ========== DIAGNÓSTICO ==========
 @app.route('/api/diagnostic/browser', methods=['GET'])
 def diagnostic_browser():
@@ -1176,9 +4058,126 @@ def diagnostic_browser():
         return jsonify({'error': str(e)}), 500
 
 # ========== INICIALIZAÇÃO ==========
-def startup_tasks():
+X_DISPLAY_SOCKET = '/tmp/.X11-unix/X0'  # socket do DISPLAY=:0
+STARTUP_WAIT_TIMEOUT = float(os.environ.get('PI_MANAGER_STARTUP_TIMEOUT', 180))
+STARTUP_POLL_INTERVAL = 0.25
+
+def wait_until(predicate, timeout, interval=STARTUP_POLL_INTERVAL):
+    """Espera a condição ficar verdadeira, consultando a cada interval; False se estourar"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if predicate():
+                return True
+        except Exception:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+def since_boot_ms():
+    """Milissegundos desde o boot do sistema (inclui tempo suspenso)"""
+    return round(time.clock_gettime(getattr(time, 'CLOCK_BOOTTIME', time.CLOCK_MONOTONIC)) * 1000)
+
+class StartupOrchestrator:
+    """Executa a inicialização em segundo plano, sem segurar o servidor HTTP. Cada etapa
+    roda na própria thread, espera as etapas de que depende e as condições de prontidão
+    (display X no ar, diretório de perfis) em vez de pausas fixas, e registra os tempos
+    na linha do tempo exposta em /api/health/startup."""
+    def __init__(self):
+        self.started_at = None
+        self._t0 = time.monotonic()
+        self._boot_ms = since_boot_ms()
+        self.conditions = {}
+        self.steps = OrderedDict()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def condition(self, name, predicate):
+        self.conditions[name] = predicate
+
+    def step(self, name, func, after=(), wait_for=()):
+        self.steps[name] = {'name': name, 'func': func, 'after': tuple(after), 'wait_for': tuple(wait_for),
+                            'status': 'pending', 'done': threading.Event()}
+
+    def _elapsed_ms(self):
+        return round((time.monotonic() - self._t0) * 1000)
+
+    def mark(self, event):
+        """Registra um marco avulso na linha do tempo (ex.: servidor HTTP, primeira requisição)"""
+        with self._lock:
+            if any(existing['event'] == event for existing in self.events):
+                return
+            self.events.append({'event': event, 'at_ms': self._elapsed_ms(), 'since_boot_ms': since_boot_ms()})
+
+    def start(self):
+        if self.started_at is not None:
+            return
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self._t0 = time.monotonic()
+        self._boot_ms = since_boot_ms()
+        print(f"🚦 Inicialização em segundo plano: {', '.join(self.steps)}")
+        for step in self.steps.values():
+            threading.Thread(target=self._run, args=(step,), daemon=True, name=f"startup-{step['name']}").start()
+
+    def _update(self, step, drop=(), **fields):
+        """Altera o estado da etapa sob o lock, para timeline() nunca ver um dict mudando"""
+        with self._lock:
+            for key in drop:
+                step.pop(key, None)
+            step.update(fields)
+
+    def _run(self, step):
+        try:
+            for dependency in step['after']:
+                self.steps[dependency]['done'].wait()
+                if self.steps[dependency]['status'] != 'done':
+                    raise RuntimeError(f"etapa {dependency} não concluída")
+            self._update(step, status='waiting', wait_started_ms=self._elapsed_ms())
+            for condition in step['wait_for']:
+                self._update(step, waiting_for=condition)
+                if not wait_until(self.conditions[condition], STARTUP_WAIT_TIMEOUT):
+                    self._update(step, status='timeout')
+                    raise TimeoutError(f"condição {condition} não atendida em {STARTUP_WAIT_TIMEOUT:.0f}s")
+            self._update(step, drop=('waiting_for',), status='running', started_ms=self._elapsed_ms())
+            result = step['func']()
+            if result is False:
+                raise RuntimeError('etapa retornou falha')
+            self._update(step, status='done')
+        except Exception as e:
+            self._update(step, status=step['status'] if step['status'] == 'timeout' else 'failed', error=str(e))
+            print(f"❌ Etapa de inicialização {step['name']}: {e}")
+        finally:
+            self._update(step, finished_ms=self._elapsed_ms(), since_boot_ms=since_boot_ms())
+            step['done'].set()
+
+    def timeline(self):
+        with self._lock:
+            snapshot = [{key: value for key, value in step.items() if key not in ('func', 'done')}
+                        for step in self.steps.values()]
+            events = list(self.events)
+        now_ms = self._elapsed_ms()
+        for entry in snapshot:
+            entry['after'] = list(entry['after'])
+            entry['wait_for'] = list(entry['wait_for'])
+            if 'started_ms' in entry and 'finished_ms' in entry:
+                entry['duration_ms'] = entry['finished_ms'] - entry['started_ms']
+            if 'wait_started_ms' in entry:
+                entry['wait_ms'] = entry.get('started_ms', entry.get('finished_ms', now_ms)) - entry['wait_started_ms']
+        return {
+            'started_at': self.started_at,
+            'process_start_since_boot_ms': self._boot_ms,
+            'elapsed_ms': now_ms,
+            'ready': all(entry['status'] == 'done' for entry in snapshot),
+            'conditions': {name: bool(predicate()) for name, predicate in self.conditions.items()},
+            'steps': snapshot,
+            'events': events
+        }
+
+def ensure_config():
     os.makedirs(CONFIG_DIR, exist_ok=True)
-    
+    # Garante que o diretório do perfil existe
+    favorites_manager.bookmarks_file.parent.mkdir(parents=True, exist_ok=True)
     # Verifica se o arquivo autostart.conf existe
     if not os.path.exists(AUTOSTART_CONFIG) or os.path.getsize(AUTOSTART_CONFIG) == 0:
         print("📝 Criando autostart.conf com URLs padrão...")
@@ -1186,37 +4185,66 @@ def startup_tasks():
             'http://localhost:5000',
             'https://www.google.com'
         ]
-        with open(AUTOSTART_CONFIG, 'w') as f:
-            for url in default_urls:
-                f.write(url + '\n')
+        atomic_write(AUTOSTART_CONFIG, ''.join(url + '\n' for url in default_urls))
         print(f"✅ autostart.conf criado com {len(default_urls)} URLs padrão")
-    
-    # Aguarda um pouco para garantir que o sistema está pronto
-    time.sleep(2)
-    
-    # Sincroniza favoritos
+
+def startup_sync_favorites():
     print("🔄 Sincronizando favoritos do Chromium...")
-    urls = load_autostart_urls()
-    if urls:
-        formatted_urls = [format_url(url.strip()) for url in urls if url.strip()]
-        success, message = favorites_manager.sync_favorites_with_config(formatted_urls)
-        if success:
-            print(f"✅ {message}")
-        else:
-            print(f"❌ Erro: {message}")
+    success, message = sync_chromium_favorites()
+    print(f"{'✅' if success else '⚠️'} {message}")
+
+startup = StartupOrchestrator()
+startup.condition('x_display', lambda: os.path.exists(X_DISPLAY_SOCKET))
+startup.condition('profile_dir', lambda: favorites_manager.chromium_profile_dir.is_dir())
+startup.step('config', ensure_config)
+startup.step('metrics', metrics_sampler.start)
+startup.step('wifi_scan', wifi_scanner.start_background)
+startup.step('profile', profile_stager.stage, wait_for=['profile_dir'])
+startup.step('config_watcher', config_watcher.start, after=['config', 'profile'])
+startup.step('favorites', startup_sync_favorites, after=['config', 'profile'])
+# O contador de BACKUP_PRUNE_EVERY zera a cada reinício: sem isto a retenção quase nunca roda
+startup.step('backup_retention', favorites_manager.backup_store.prune, after=['favorites'])
+startup.step('browser', open_browser_with_urls, after=['favorites'], wait_for=['x_display'])
+
+@app.before_request
+def mark_first_request():
+    startup.mark('first_request')
+
+@app.route('/api/health/startup', methods=['GET'])
+def startup_health():
+    """Linha do tempo da inicialização (boot -> servidor -> favoritos -> browser)"""
+    if not check_auth():
+        return jsonify({'error': 'Não autenticado'}), 401
     
-    # Fallback para abrir URLs
-    print("⏰ Iniciando thread para abrir browser em 10 segundos...")
-    time.sleep(3)  # Aguarda mais para sincronização terminar
-    browser_thread = threading.Thread(target=open_browser_with_urls)
-    browser_thread.daemon = True
-    browser_thread.start()
+    try:
+        return jsonify({'success': True, **startup.timeline()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def handle_sigterm(signum, frame):
+    """systemctl stop/restart e o desligamento mandam SIGTERM, que não passa pelo atexit"""
+    print("🛑 SIGTERM recebido; gravando perfil e métricas antes de sair")
+    profile_stager.write_back()
+    metrics_history.flush()
+    sys.exit(0)
 
-with app.app_context():
-    startup_tasks()
+def start_app():
+    """Efeitos do serviço no sistema: histórico no arquivo, gravações no desligamento e a
+    inicialização em segundo plano (favoritos, observador, browser...). Só importar o
+    módulo, como fazem os testes, não toca em nada fora do processo."""
+    metrics_history.load(METRICS_HISTORY_FILE)
+    atexit.register(metrics_history.flush)
+    atexit.register(profile_stager.write_back)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    # Só dispara threads: o servidor sobe sem esperar
+    startup.start()
 
 if __name__ == '__main__':
     debug_mode = os.environ.get('DEBUG', 'False').lower() == 'true'
     print(f"🚀 Iniciando servidor Flask em modo {'debug' if debug_mode else 'produção'}...")
     print(f"🌐 Acesse em: http://0.0.0.0:5000")
+    # Em debug o reloader executa este bloco no processo observador e no filho: só o filho serve
+    if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_app()
+    startup.mark('http_server')
     app.run(host='0.0.0.0', port=5000, debug=debug_mode, threaded=True)
\ No newline at end of file
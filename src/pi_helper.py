@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""Processo auxiliar privilegiado do Gerenciador Raspberry PI.
+
+Roda como root (serviço pi-manager-helper) e atende o app por um socket Unix,
+substituindo o fork/exec de `sudo` a cada chamada. O protocolo é JSON por linha:
+
+    requisição: {"cmd": "nmcli", "args": ["con", "show"], "input": null, "timeout": 20}
+    resposta:   {"returncode": 0, "stdout": "...", "stderr": ""}
+
+Se o comando estourar o timeout, a resposta traz "timeout": true e returncode 124.
+
+Somente os comandos de COMMANDS são aceitos, cada um com sua validação.
+
+Uso:
+    sudo python3 pi_helper.py serve
+    python3 pi_helper.py benchmark [-n 50]
+"""
+import argparse
+import grp
+import json
+import os
+import pwd
+import re
+import select
+import socket
+import socketserver
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SOCKET_PATH = os.environ.get('PI_HELPER_SOCKET', '/run/pi-manager/helper.sock')
+ALLOWED_USER = 'administrador'
+MAX_REQUEST_SIZE = 64 * 1024
+DEFAULT_TIMEOUT = 60
+HOSTNAME_PATTERN = re.compile(r'^[a-zA-Z0-9-]{1,63}$')
+NMCLI_OBJECTS = {'general', 'con', 'connection', 'dev', 'device', 'radio'}
+
+
+class HelperError(Exception):
+    """Requisição recusada pela validação do auxiliar"""
+
+
+class HelperUnavailable(Exception):
+    """Socket do auxiliar inexistente ou conexão recusada"""
+
+
+class HelperRequestLost(Exception):
+    """Requisição já enviada, mas a resposta não chegou: o comando pode ter rodado, então
+    não se repete nem se recorre ao sudo"""
+
+
+# ========== VALIDAÇÃO DOS COMANDOS ==========
+def validate_strings(args, limit=32):
+    if not isinstance(args, list) or len(args) > limit:
+        raise HelperError('Argumentos inválidos')
+    for arg in args:
+        if not isinstance(arg, str) or '\x00' in arg or len(arg) > 512:
+            raise HelperError('Argumentos inválidos')
+    return args
+
+
+def check_nmcli(args, data):
+    validate_strings(args)
+    # Pula opções globais (-t, -f CAMPOS) até o objeto do nmcli
+    index = 0
+    while index < len(args) and args[index].startswith('-'):
+        index += 2 if args[index] in ('-f', '--fields') else 1
+    if index >= len(args) or args[index] not in NMCLI_OBJECTS:
+        raise HelperError('Subcomando do nmcli não permitido')
+    return ['nmcli'] + args, None
+
+
+def check_hostnamectl(args, data):
+    validate_strings(args)
+    if len(args) != 2 or args[0] != 'set-hostname' or not HOSTNAME_PATTERN.match(args[1]):
+        raise HelperError('Uso permitido: hostnamectl set-hostname NOME')
+    return ['hostnamectl'] + args, None
+
+
+def check_chpasswd(args, data):
+    if args or not isinstance(data, str) or '\n' in data.rstrip('\n'):
+        raise HelperError('chpasswd aceita uma única linha na entrada')
+    user, _, password = data.partition(':')
+    if user != ALLOWED_USER or not password:
+        raise HelperError(f'chpasswd só é permitido para {ALLOWED_USER}')
+    return ['chpasswd'], data
+
+
+def check_pkill(args, data):
+    if args not in (['-f', 'chromium'], ['-HUP', 'chromium']):
+        raise HelperError('pkill só é permitido para o chromium')
+    return ['pkill'] + args, None
+
+
+def check_shutdown(args, data):
+    if args not in (['-r', '+1'], ['-h', '+1'], ['-r', 'now'], ['-h', 'now']):
+        raise HelperError('Opções de shutdown não permitidas')
+    return ['shutdown'] + args, None
+
+
+COMMANDS = {
+    'nmcli': check_nmcli,
+    'hostnamectl': check_hostnamectl,
+    'chpasswd': check_chpasswd,
+    'pkill': check_pkill,
+    'shutdown': check_shutdown,
+}
+
+
+# ========== OPERAÇÕES INTERNAS ==========
+def replace_file(path, data):
+    """Troca o arquivo por rename, como o `sed -i`: temporário no mesmo diretório, fsync,
+    mesmo dono e permissões, os.replace e fsync do diretório"""
+    directory = os.path.dirname(path)
+    st = os.stat(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chown(tmp_path, st.st_uid, st.st_gid)
+        os.chmod(tmp_path, st.st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def set_hostname(args, timeout=DEFAULT_TIMEOUT):
+    """hostnamectl + /etc/hostname + /etc/hosts, sem os três `sed` do app"""
+    validate_strings(args, limit=1)
+    if len(args) != 1 or not HOSTNAME_PATTERN.match(args[0]):
+        raise HelperError('Hostname inválido')
+    hostname = args[0]
+    result = subprocess.run(['hostnamectl', 'set-hostname', hostname], capture_output=True, text=True, timeout=timeout)
+    if result.returncode != 0:
+        return result.returncode, result.stdout, result.stderr
+    replace_file('/etc/hostname', hostname + '\n')
+    with open('/etc/hosts', 'r') as f:
+        lines = f.readlines()
+    replace_file('/etc/hosts', ''.join(f'127.0.1.1\t{hostname}\n' if line.startswith('127.0.1.1') else line for line in lines))
+    return 0, '', ''
+
+
+OPERATIONS = {
+    'ping': lambda args, timeout=None: (0, 'pong', ''),
+    'set_hostname': set_hostname,
+}
+
+
+def execute(request):
+    cmd = request.get('cmd')
+    args = request.get('args') or []
+    timeout = request.get('timeout') or DEFAULT_TIMEOUT
+    if not isinstance(timeout, (int, float)) or timeout <= 0:
+        raise HelperError('Timeout inválido')
+    try:
+        if cmd in OPERATIONS:
+            returncode, stdout, stderr = OPERATIONS[cmd](args, timeout=timeout)
+            return {'returncode': returncode, 'stdout': stdout, 'stderr': stderr}
+        if cmd not in COMMANDS:
+            raise HelperError(f'Comando não permitido: {cmd}')
+        argv, data = COMMANDS[cmd](args, request.get('input'))
+        result = subprocess.run(argv, input=data, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'returncode': 124, 'stdout': '', 'stderr': f'Tempo esgotado após {timeout}s', 'timeout': True}
+    return {'returncode': result.returncode, 'stdout': result.stdout, 'stderr': result.stderr}
+
+
+# ========== SERVIDOR ==========
+class HelperRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        if not self.server.peer_allowed(self.request):
+            return
+        # Conexão persistente: várias requisições por conexão
+        while True:
+            line = self.rfile.readline(MAX_REQUEST_SIZE)
+            if not line:
+                return
+            if not line.endswith(b'\n'):
+                # Requisição maior que o limite: o resto dela seria lido como outra requisição.
+                # Responde uma vez e fecha, para a resposta não sair de ordem na conexão.
+                error = f'Requisição maior que {MAX_REQUEST_SIZE} bytes'
+                self.wfile.write(json.dumps({'returncode': 126, 'stdout': '', 'stderr': error, 'error': error}).encode('utf-8') + b'\n')
+                return
+            try:
+                response = execute(json.loads(line))
+            except HelperError as e:
+                response = {'returncode': 126, 'stdout': '', 'stderr': str(e), 'error': str(e)}
+            except Exception as e:
+                response = {'returncode': 1, 'stdout': '', 'stderr': str(e), 'error': str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class HelperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, allowed_uids):
+        self.allowed_uids = allowed_uids
+        if os.path.exists(path):
+            os.unlink(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        super().__init__(path, HelperRequestHandler)
+
+    def peer_allowed(self, sock):
+        """Confere o UID do processo do outro lado via SO_PEERCRED"""
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', creds)
+        return uid in self.allowed_uids
+
+
+def serve(path):
+    user = pwd.getpwnam(ALLOWED_USER)
+    server = HelperServer(path, {0, user.pw_uid})
+    os.chown(path, 0, grp.getgrnam(ALLOWED_USER).gr_gid)
+    os.chmod(path, 0o660)
+    print(f"🔐 Auxiliar privilegiado ouvindo em {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+# ========== CLIENTE ==========
+class HelperClient:
+    """Cliente com conexões persistentes reaproveitadas entre chamadas"""
+    def __init__(self, path=SOCKET_PATH, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def _connect(self):
+        """(socket, leitor, veio do pool)"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                sock, reader = self._idle.pop()
+            # Conexão ociosa legível = EOF (auxiliar reiniciado): descarta antes de enviar
+            readable, _, _ = select.select([sock], [], [], 0)
+            if not readable:
+                return sock, reader, True
+            sock.close()
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+        except OSError as e:
+            raise HelperUnavailable(str(e))
+        return sock, sock.makefile('rb'), False
+
+    def call(self, cmd, args=None, input=None, timeout=None):
+        """Executa um comando no auxiliar; retorna o dict de resposta"""
+        request = {'cmd': cmd, 'args': args or [], 'input': input}
+        if timeout:
+            request['timeout'] = timeout
+        request = json.dumps(request).encode('utf-8') + b'\n'
+        while True:
+            sock, reader, pooled = self._connect()
+            try:
+                # Margem sobre o timeout do comando, que é aplicado pelo próprio auxiliar
+                sock.settimeout(timeout + 5 if timeout else self.timeout)
+                sock.sendall(request)
+            except OSError as e:
+                sock.close()
+                # Só aqui é seguro tentar de novo: o auxiliar não recebeu a requisição
+                if pooled:
+                    continue
+                raise HelperUnavailable(str(e))
+            try:
+                line = reader.readline()
+                if not line:
+                    raise ConnectionError('Conexão encerrada pelo auxiliar')
+            except OSError as e:
+                sock.close()
+                raise HelperRequestLost(str(e))
+            with self._lock:
+                self._idle.append((sock, reader))
+            return json.loads(line)
+
+    def run(self, argv, input=None, timeout=None):
+        """Equivalente a subprocess.run(['sudo'] + argv, capture_output=True, text=True, timeout=timeout)"""
+        response = self.call(argv[0], argv[1:], input, timeout)
+        if response.get('timeout'):
+            raise subprocess.TimeoutExpired(argv, timeout)
+        return subprocess.CompletedProcess(argv, response['returncode'], response['stdout'], response['stderr'])
+
+
+# ========== BENCHMARK ==========
+def measure(label, func, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<32} média {statistics.mean(timings):8.2f} ms | p50 {statistics.median(timings):8.2f} ms | p95 {p95:8.2f} ms")
+    return statistics.mean(timings)
+
+
+def benchmark(path, rounds):
+    """Compara `sudo nmcli ...` com o mesmo comando pelo auxiliar"""
+    argv = ['nmcli', '-t', '-f', 'RUNNING', 'general']
+    client = HelperClient(path)
+    print(f"⏱️ {rounds} execuções de: {' '.join(argv)}")
+    sudo_ms = measure('sudo (fork/exec + PAM)', lambda: subprocess.run(['sudo', '-n'] + argv, capture_output=True, text=True), rounds)
+    if not client.available():
+        print(f"⚠️ Auxiliar não encontrado em {path}; só o caminho sudo foi medido")
+        return
+    measure('auxiliar (RPC ping)', lambda: client.call('ping'), rounds)
+    helper_ms = measure('auxiliar (RPC + nmcli)', lambda: client.run(argv), rounds)
+    if helper_ms > 0:
+        print(f"🚀 Auxiliar {sudo_ms / helper_ms:.1f}x mais rápido que sudo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Auxiliar privilegiado do Gerenciador Raspberry PI')
+    parser.add_argument('mode', choices=['serve', 'benchmark'])
+    parser.add_argument('--socket', default=SOCKET_PATH)
+    parser.add_argument('-n', '--rounds', type=int, default=50)
+    options = parser.parse_args()
+    if options.mode == 'serve':
+        if os.geteuid() != 0:
+            print("❌ O auxiliar precisa rodar como root")
+            sys.exit(1)
+        serve(options.socket)
+    else:
+        benchmark(options.socket, options.rounds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Servidor DevTools de mentira para os testes: /json/* por HTTP e Page.* por WebSocket.
+
+Só o necessário para o CdpClient e o KioskTabs: mantém uma lista de abas, registra cada
+operação em `log` e permite simular o que o Chromium real faz (eventos antes da resposta,
+respostas fragmentadas, pings, erros e versões que só aceitam GET em /json/new).
+"""
+import base64
+import hashlib
+import itertools
+import json
+import socketserver
+import struct
+import threading
+from urllib.parse import unquote
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class StubDevTools:
+    def __init__(self):
+        self.tabs = {}
+        self.log = []
+        self.new_tab_methods = ('PUT',)  # Chromium recente; ('GET',) simula versões antigas
+        self.bad_accept = False
+        self.fragment_responses = True
+        self.send_ping = False
+        self.pongs = []
+        self.errors = {}  # método CDP -> mensagem de erro
+        self.redirects = {}  # URL pedida -> URL que a aba passa a mostrar
+        self._ids = itertools.count(1)
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                stub._handle(self.rfile, self.wfile)
+
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def open_tab(self, url, type='page'):
+        target_id = f'T{next(self._ids)}'
+        self.tabs[target_id] = {
+            'id': target_id,
+            'type': type,
+            'url': self.redirects.get(url, url),
+            'webSocketDebuggerUrl': f'ws://127.0.0.1:{self.port}/devtools/page/{target_id}'
+        }
+        return self.tabs[target_id]
+
+    def urls(self):
+        return [tab['url'] for tab in self.tabs.values() if tab['type'] == 'page']
+
+    def operations(self):
+        return [entry[0] for entry in self.log]
+
+    # ---------- HTTP ----------
+    def _handle(self, rfile, wfile):
+        method, path, _ = rfile.readline().decode('latin-1').split()
+        headers = {}
+        while True:
+            line = rfile.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if path.startswith('/devtools/page/'):
+            return self._websocket(rfile, wfile, headers, path.rsplit('/', 1)[1])
+        status, body = 200, ''
+        if path == '/json/version':
+            body = json.dumps({'Browser': 'Stub/1.0'})
+        elif path == '/json/list':
+            body = json.dumps(list(self.tabs.values()))
+        elif path.startswith('/json/new'):
+            if method not in self.new_tab_methods:
+                status = 405
+            else:
+                tab = self.open_tab(unquote(path.partition('?')[2]))
+                self.log.append(('open', tab['id'], tab['url']))
+                body = json.dumps(tab)
+        elif path.startswith('/json/close/'):
+            target_id = path.rsplit('/', 1)[1]
+            if self.tabs.pop(target_id, None) is None:
+                status, body = 404, 'No such target id'
+            else:
+                self.log.append(('close', target_id))
+                body = 'Target is closing'
+        else:
+            status = 404
+        data = body.encode('utf-8')
+        wfile.write(f'HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n\r\n'.encode('latin-1') + data)
+
+    # ---------- WebSocket ----------
+    def _websocket(self, rfile, wfile, headers, target_id):
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest()).decode()
+        if self.bad_accept:
+            accept = 'x' + accept[1:]
+        wfile.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode('latin-1'))
+        while True:
+            frame = self._read_frame(rfile)
+            if frame is None:
+                return
+            opcode, masked, payload = frame
+            assert masked, 'quadros do cliente precisam ser mascarados'
+            if opcode == 0x8:
+                return
+            if opcode == 0xA:
+                self.pongs.append(payload)
+                continue
+            message = json.loads(payload)
+            self.log.append((message['method'], target_id, message.get('params', {})))
+            if self.send_ping:
+                wfile.write(self._frame(0x9, b'ping'))
+                # O pong precisa chegar antes de qualquer resposta
+                opcode, _, payload = self._read_frame(rfile)
+                assert opcode == 0xA
+                self.pongs.append(payload)
+            # Evento antes da resposta, como o Chromium faz
+            wfile.write(self._frame(0x1, json.dumps({'method': 'Page.frameStartedLoading', 'params': {}}).encode()))
+            if message['method'] in self.errors:
+                response = {'id': message['id'], 'error': {'code': -32000, 'message': self.errors[message['method']]}}
+            else:
+                response = {'id': message['id'], 'result': self._execute(target_id, message)}
+            data = json.dumps(response).encode()
+            if self.fragment_responses:
+                wfile.write(self._frame(0x1, data[:7], final=False) + self._frame(0x0, data[7:]))
+            else:
+                wfile.write(self._frame(0x1, data))
+
+    def _execute(self, target_id, message):
+        params = message.get('params', {})
+        if message['method'] == 'Page.navigate':
+            self.tabs[target_id]['url'] = self.redirects.get(params['url'], params['url'])
+            # Resultado grande o bastante para usar o tamanho estendido de 16 bits
+            return {'frameId': 'F' * 200, 'loaderId': target_id}
+        return {}
+
+    @staticmethod
+    def _read_frame(rfile):
+        header = rfile.read(2)
+        if len(header) < 2:
+            return None
+        opcode, length = header[0] & 0x0F, header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', rfile.read(8))[0]
+        masked = bool(header[1] & 0x80)
+        mask = rfile.read(4) if masked else b'\0\0\0\0'
+        payload = bytes(byte ^ mask[i % 4] for i, byte in enumerate(rfile.read(length)))
+        return opcode, masked, payload
+
+    @staticmethod
+    def _frame(opcode, payload, final=True):
+        first = (0x80 if final else 0) | opcode
+        if len(payload) < 126:
+            return bytes([first, len(payload)]) + payload
+        return bytes([first, 126]) + struct.pack('!H', len(payload)) + payload
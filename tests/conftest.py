@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from cdp_stub import StubDevTools  # noqa: E402
+
+
+@pytest.fixture
+def devtools():
+    stub = StubDevTools()
+    stub.start()
+    yield stub
+    stub.stop()
@@ -0,0 +1,12 @@
+"""Importar o app (como fazem os testes) não pode iniciar o kiosk nem mexer no sistema"""
+import threading
+
+import app
+
+
+def test_import_does_not_start_the_service():
+    assert app.startup.started_at is None
+    assert app.metrics_history.path is None
+    assert not app.profile_stager.staged
+    assert app.browser_supervisor.process is None
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith('startup-')]
@@ -0,0 +1,151 @@
+"""CdpClient, CdpWebSocket e KioskTabs contra o servidor DevTools de mentira (cdp_stub)"""
+import socket
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client(devtools):
+    return app.CdpClient(port=devtools.port, timeout=2)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ========== CdpClient ==========
+def test_available(client):
+    assert client.available()
+
+
+def test_not_available_without_devtools():
+    assert not app.CdpClient(port=free_port(), timeout=1).available()
+
+
+def test_pages_skips_devtools_and_non_page_targets(devtools, client):
+    devtools.open_tab('http://painel.local/')
+    devtools.open_tab('devtools://devtools/bundled/inspector.html')
+    devtools.open_tab('chrome-extension://abc/background.html', type='background_page')
+    assert [page['url'] for page in client.pages()] == ['http://painel.local/']
+
+
+def test_new_tab_uses_put(devtools, client):
+    tab = client.new_tab('http://painel.local/?a=1&b=2')
+    assert tab['url'] == 'http://painel.local/?a=1&b=2'
+    assert devtools.urls() == ['http://painel.local/?a=1&b=2']
+
+
+def test_new_tab_falls_back_to_get(devtools, client):
+    devtools.new_tab_methods = ('GET',)
+    client.new_tab('http://painel.local/')
+    assert devtools.urls() == ['http://painel.local/']
+
+
+def test_new_tab_error(devtools, client):
+    devtools.new_tab_methods = ()
+    with pytest.raises(app.CdpError):
+        client.new_tab('http://painel.local/')
+
+
+def test_close_tab(devtools, client):
+    tab = devtools.open_tab('http://painel.local/')
+    client.close_tab(tab['id'])
+    assert devtools.tabs == {}
+
+
+def test_navigate_joins_fragments_and_skips_events(devtools, client):
+    tab = devtools.open_tab('http://antigo.local/')
+    client.navigate(tab, 'http://novo.local/')
+    assert devtools.urls() == ['http://novo.local/']
+    assert devtools.log[-1] == ('Page.navigate', tab['id'], {'url': 'http://novo.local/'})
+
+
+def test_call_returns_extended_length_result(devtools, client):
+    devtools.fragment_responses = False
+    tab = devtools.open_tab('http://antigo.local/')
+    result = client.call(tab, 'Page.navigate', {'url': 'http://novo.local/'})
+    assert result['frameId'] == 'F' * 200
+
+
+def test_call_sends_extended_length_frame(devtools, client):
+    tab = devtools.open_tab('http://antigo.local/')
+    long_url = 'http://painel.local/?q=' + 'x' * 70000
+    client.navigate(tab, long_url)
+    assert devtools.urls() == [long_url]
+
+
+def test_ping_is_answered_with_pong(devtools, client):
+    devtools.send_ping = True
+    tab = devtools.open_tab('http://painel.local/')
+    client.reload(tab)
+    assert devtools.pongs == [b'ping']
+
+
+def test_cdp_error_is_raised(devtools, client):
+    devtools.errors['Page.reload'] = 'Not attached to an active page'
+    tab = devtools.open_tab('http://painel.local/')
+    with pytest.raises(app.CdpError, match='Not attached'):
+        client.reload(tab)
+
+
+def test_handshake_with_wrong_accept_is_rejected(devtools, client):
+    devtools.bad_accept = True
+    tab = devtools.open_tab('http://painel.local/')
+    with pytest.raises(app.CdpError, match='Handshake'):
+        client.reload(tab)
+
+
+# ========== KioskTabs ==========
+def test_apply_keeps_navigates_opens_and_closes(devtools, client):
+    devtools.open_tab('http://a.local/')
+    devtools.open_tab('http://velho.local/')
+    devtools.open_tab('http://sobra.local/')
+    tabs = app.KioskTabs(client)
+    summary = tabs.apply(['http://a.local', 'http://b.local/', 'http://c.local/'])
+    assert summary == {'kept': 1, 'navigated': 2, 'opened': 0, 'closed': 0, 'reloaded': 0}
+    assert devtools.urls() == ['http://a.local/', 'http://b.local/', 'http://c.local/']
+
+    summary = tabs.apply(['http://c.local/', 'http://d.local/'])
+    assert summary == {'kept': 1, 'navigated': 1, 'opened': 0, 'closed': 1, 'reloaded': 0}
+    assert sorted(devtools.urls()) == ['http://c.local/', 'http://d.local/']
+
+
+def test_apply_opens_missing_tabs(devtools, client):
+    devtools.open_tab('http://a.local/')
+    summary = app.KioskTabs(client).apply(['http://a.local/', 'http://b.local/'])
+    assert summary['opened'] == 1
+    assert devtools.urls() == ['http://a.local/', 'http://b.local/']
+
+
+def test_apply_is_idempotent(devtools, client):
+    tabs = app.KioskTabs(client)
+    tabs.apply(['http://a.local/', 'http://b.local/'])
+    operations = len(devtools.log)
+    summary = tabs.apply(['http://a.local/', 'http://b.local/'])
+    assert summary == {'kept': 2, 'navigated': 0, 'opened': 0, 'closed': 0, 'reloaded': 0}
+    assert len(devtools.log) == operations
+
+
+def test_apply_does_not_reload_redirected_tabs(devtools, client):
+    devtools.redirects['http://painel.local/'] = 'https://painel.local/login'
+    tabs = app.KioskTabs(client)
+    tabs.apply(['http://painel.local/'])
+    assert devtools.urls() == ['https://painel.local/login']
+    summary = tabs.apply(['http://painel.local/'])
+    assert summary['kept'] == 1 and summary['navigated'] == 0
+
+
+def test_apply_reload_only_touches_kept_tabs(devtools, client):
+    devtools.open_tab('http://a.local/')
+    summary = app.KioskTabs(client).apply(['http://a.local/', 'http://b.local/'], reload=True)
+    assert summary['reloaded'] == 1
+    assert devtools.operations().count('Page.reload') == 1
+
+
+def test_apply_without_devtools_raises():
+    with pytest.raises(app.CdpError):
+        app.KioskTabs(app.CdpClient(port=free_port(), timeout=1)).apply(['http://a.local/'])